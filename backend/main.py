@@ -8,11 +8,15 @@ from sentence_transformers import SentenceTransformer
 from backend.services.auth import verify_token
 from backend.services.knowledgeRetriever import HybridRetriever
 # detect_intent_llm removed (LLM intent detection commented out)
-from backend.services.utils import rebuild_index
+from backend.services.utils import load_or_build_index, watch_index_snapshot
+from backend.services.index_snapshot import corpus_hash
+from backend.variables.settings import EMBEDDING_MODEL_NAME, SHARED_INDEX
 from backend.services.database import db_service
+from backend.services.concurrency import start_retrieval_pool, shutdown_retrieval_pool
+from backend.services.embedding_batcher import EmbeddingBatcher
 import asyncio
 from typing import List
-from backend.routes import health_check, knowledge, appointment_tools, chat
+from backend.routes import health_check, knowledge, appointment_tools, chat, retrieval
 
 class ConnectionManager:
     def __init__(self):
@@ -58,9 +62,13 @@ async def lifespan(app: FastAPI):
 
     print("🔄 Loading sentence transformer global_state.model...")
     start = time.time()
-    global_state.model = SentenceTransformer('all-MiniLM-L6-v2')  # Only for embeddings, not LLM
+    global_state.model = SentenceTransformer(EMBEDDING_MODEL_NAME)  # Only for embeddings, not LLM
     print(f"✅ Model loaded in {time.time() - start:.2f}s")
 
+    # Concurrent query encodes are coalesced into batched model calls
+    global_state.embedder = EmbeddingBatcher(global_state.model)
+    start_retrieval_pool()
+
     # Initialize SQLite database
     print("🔄 Initializing database...")
     await db_service.init_db()
@@ -72,20 +80,38 @@ async def lifespan(app: FastAPI):
             docs = json.load(f)
         for doc in docs:
             global_state.documents[doc["id"]] = doc
-        rebuild_index()
+
+        # Warm start from a memory-mapped snapshot when the corpus is unchanged
+        # (with several workers, the first one builds it and the rest map it)
+        load_or_build_index(corpus_hash(global_state.documents))
         print(f"✅ Loaded {len(global_state.documents)} global_state.documents")
 
         # Initialize global_state.retriever
-        global_state.retriever = HybridRetriever(global_state.model, global_state.index, global_state.documents, global_state.doc_ids)
+        global_state.retriever = HybridRetriever(
+            global_state.embedder,
+            global_state.index,
+            global_state.chunks,
+            global_state.lexical_index,
+            embedding_cache=global_state.embedding_cache,
+            semantic_cache=global_state.semantic_cache
+        )
         print("✅ Retriever initialized")
 
     else:
         print("⚠️ knowledge.json not found, starting with empty knowledge base")
 
+    # Shared index: follow snapshots published by other workers' upserts
+    watcher = asyncio.create_task(watch_index_snapshot()) if SHARED_INDEX else None
+
     yield  # <-- application runs here
 
     # Cleanup logic (if any)
     print("🛑 Shutting down app...")
+    if watcher is not None:
+        watcher.cancel()
+    shutdown_retrieval_pool()
+    global_state.embedder.close()
+    await db_service.close()
 
 app = FastAPI(title="FastLane RAG Orchestrator", lifespan=lifespan)
 
@@ -128,6 +154,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
 app.include_router(health_check.router)
 app.include_router(knowledge.router)
+app.include_router(retrieval.router)
 app.include_router(appointment_tools.router)
 app.include_router(chat.router)
 
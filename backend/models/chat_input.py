@@ -1,6 +1,9 @@
 from pydantic import BaseModel
+from typing import Optional
 
 
 class ChatInput(BaseModel):
     session_id: str
-    message: str
\ No newline at end of file
+    message: str
+    include_tags: Optional[list[str]] = None  # restrict retrieval to documents with any of these tags
+    exclude_tags: Optional[list[str]] = None
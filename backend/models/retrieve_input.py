@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class RetrieveBatchInput(BaseModel):
+    queries: list[str]
+    top_k: int = 3
+    include_tags: Optional[list[str]] = None
+    exclude_tags: Optional[list[str]] = None
+    ef_search: Optional[int] = None  # ANN knobs, as on /test-retrieval (bypass the result cache)
+    nprobe: Optional[int] = None
@@ -9,6 +9,10 @@ class ScheduleInput(BaseModel):
     notes: Optional[str] = None
 
 
+class ScheduleBatchInput(BaseModel):
+    appointments: list[ScheduleInput]
+
+
 class AppointmentUpdate(BaseModel):
     patient: Optional[str] = None
     preferred_slot_iso: Optional[str] = None
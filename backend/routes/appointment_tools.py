@@ -1,7 +1,9 @@
 import time
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 from backend.services.appointments import (
     schedule_appointment, 
+    schedule_appointments,
     get_all_appointments, 
     get_appointment,
     update_appointment,
@@ -10,7 +12,8 @@ from backend.services.appointments import (
     clear_all_appointments
 )
 from backend.variables.global_states import session_context
-from backend.models.schedule_input import ScheduleInput, AppointmentUpdate
+from backend.models.schedule_input import ScheduleInput, ScheduleBatchInput, AppointmentUpdate
+from backend.variables.settings import SCHEDULE_BATCH_MAX
 
 router = APIRouter()
 
@@ -19,6 +22,7 @@ router = APIRouter()
 async def schedule_endpoint(payload: ScheduleInput):
     """
     Create a new appointment (CREATE)
+    409 when the patient is already booked at that slot at another location
     """
     start = time.time()
 
@@ -28,17 +32,62 @@ async def schedule_endpoint(payload: ScheduleInput):
         "location": payload.location,
         "notes": payload.notes
     })
+    if not result["ok"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{payload.patient} already has an appointment at {payload.preferred_slot_iso} ({result['conflicting_appt_id']})"
+        )
 
     result["latency_ms"] = round((time.time() - start) * 1000, 2)
     return result
 
 
-@router.get("/tools/appointments")
-async def list_appointments():
+@router.post("/tools/schedule_appointments")
+async def schedule_batch_endpoint(payload: ScheduleBatchInput):
     """
-    Get all appointments (READ - List)
+    Create many appointments in one transaction (CREATE - Batch)
+    Results are per item, in request order: created / already_booked / conflict
     """
-    return await get_all_appointments()
+    if len(payload.appointments) > SCHEDULE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {SCHEDULE_BATCH_MAX} appointments per batch")
+
+    start = time.time()
+
+    result = await schedule_appointments([
+        {
+            "patient": item.patient,
+            "preferred_slot_iso": item.preferred_slot_iso,
+            "location": item.location,
+            "notes": item.notes
+        }
+        for item in payload.appointments
+    ])
+
+    latency = (time.time() - start) * 1000
+    result["latency_ms"] = round(latency, 2)
+    result["appointments_per_s"] = round(len(payload.appointments) / (latency / 1000), 1) if latency > 0 else None
+    return result
+
+
+@router.get("/tools/appointments")
+async def list_appointments(
+        limit: int = Query(100, ge=1, le=500),
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        location: Optional[str] = None,
+        patient: Optional[str] = None,
+        slot_from: Optional[str] = None,
+        slot_to: Optional[str] = None
+):
+    """
+    List appointments newest first (READ - List)
+    Paginate by passing the previous page's `next_cursor` as `cursor`;
+    filter by status, location, patient and slot range [slot_from, slot_to)
+    """
+    try:
+        return await get_all_appointments(limit, cursor, status, location, patient, slot_from, slot_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/tools/appointments/{appointment_id}")
@@ -67,6 +116,8 @@ async def update_appointment_endpoint(appointment_id: str, payload: AppointmentU
     
     result = await update_appointment(appointment_id, updates)
     
+    if result.get("conflict"):
+        raise HTTPException(status_code=409, detail=result["error"])
     if not result["ok"]:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
@@ -82,6 +133,8 @@ async def patch_appointment_endpoint(appointment_id: str, payload: AppointmentUp
     
     result = await update_appointment(appointment_id, updates)
     
+    if result.get("conflict"):
+        raise HTTPException(status_code=409, detail=result["error"])
     if not result["ok"]:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
@@ -2,7 +2,7 @@ import time, re
 from fastapi import APIRouter
 from backend.services.appointments import schedule_appointment, update_appointment, cancel_appointment
 from backend.models.chat_input import ChatInput
-from backend.services.utils import detect_intent_regex, compose_answer, get_cached_docs
+from backend.services.utils import detect_intent_regex, compose_answer, get_cached_docs_async
 
 router = APIRouter()
 
@@ -60,6 +60,8 @@ async def chat(payload: ChatInput):
 
         if tool_result.get("status") == "already_booked":
             reply = f"This appointment was already booked ({tool_result['appt_id']})."
+        elif tool_result.get("status") == "conflict":
+            reply = f"Could not book: already booked at that time elsewhere ({tool_result['conflicting_appt_id']})."
         else:
             patient = entities.get("patient", "Patient")
             location = entities.get("location", "clinic")
@@ -75,7 +77,9 @@ async def chat(payload: ChatInput):
         # --- Step 3: Retrieval + Compose for compound/info-seeking messages ---
         if not intent.get("is_rescheduling"):
             retrieve_start = time.time()
-            docs = get_cached_docs(message, top_k=3)
+            docs = await get_cached_docs_async(
+                message, top_k=3, include_tags=payload.include_tags, exclude_tags=payload.exclude_tags
+            )
             citations = [{"id": d["id"], "score": d["score"]} for d in docs]
             plan_steps.append({
                 "step": len(plan_steps) + 1,
@@ -106,6 +110,8 @@ async def chat(payload: ChatInput):
 
             if tool_result.get("status") == "already_booked":
                 reply += f" This appointment was already booked ({tool_result['appt_id']})."
+            elif tool_result.get("status") == "conflict":
+                reply += f" Could not book: already booked at that time elsewhere ({tool_result['conflicting_appt_id']})."
             else:
                 patient = entities.get("patient", "Patient")
                 location = entities.get("location", "clinic")
@@ -1,8 +1,8 @@
 import time
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Query
 import backend.variables.global_states as global_state
-import backend.main as main
-from backend.services.utils import compose_answer
+from backend.services.utils import compose_answer, get_cached_docs
 
 router = APIRouter()
 @router.get("/")
@@ -13,14 +13,51 @@ def root():
 async def say_hello(name: str):
     return {"message": f"Hello {name}"}
 
+@router.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the query result (exact), semantic and query embedding caches"""
+    return {
+        "query_cache": global_state.query_cache.stats(),
+        "semantic_cache": global_state.semantic_cache.stats() if global_state.semantic_cache else None,
+        "embedding_cache": global_state.embedding_cache.stats()
+    }
+
+@router.get("/index/stats")
+def index_stats():
+    """Vector index backend, precision and memory footprint (per million vectors)"""
+    if global_state.index is None:
+        return {"error": "Index not built"}
+    rebuilding = global_state.rebuild_thread is not None and global_state.rebuild_thread.is_alive()
+    with global_state.index_lock.read_lock():
+        return {**global_state.index.memory_report(), "generation": global_state.generation, "rebuilding": rebuilding}
+
+@router.get("/embedding/stats")
+def embedding_stats():
+    """Micro-batching metrics for query encodes (batch sizes, queue depth, wait)"""
+    if global_state.embedder is None:
+        return {"error": "Embedder not initialized"}
+    return global_state.embedder.stats()
+
 @router.get("/test-retrieval")
-def test_retrieval(query: str = "Where can I park?"):
-    """Test retrieval endpoint"""
+def test_retrieval(
+        query: str = "Where can I park?",
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        include_tags: Optional[list[str]] = Query(None),
+        exclude_tags: Optional[list[str]] = Query(None)
+):
+    """
+    Test retrieval endpoint (ef_search / nprobe tune HNSW / IVF indexes per request;
+    repeat include_tags / exclude_tags to filter by document tags)
+    """
     if global_state.retriever is None:
         return {"error": "Retriever not initialized"}
 
+    search_params = {k: v for k, v in {"ef_search": ef_search, "nprobe": nprobe}.items() if v is not None}
     start = time.time()
-    results = main.get_cached_docs(query, top_k=3)
+    results = get_cached_docs(
+        query, top_k=3, search_params=search_params, include_tags=include_tags, exclude_tags=exclude_tags
+    )
     latency = (time.time() - start) * 1000
 
     return {
@@ -39,7 +76,7 @@ def test_compose(query: str = "Where can I park?"):
 
     # Retrieve
     retrieve_start = time.time()
-    docs = main.get_cached_docs(query, top_k=3)
+    docs = get_cached_docs(query, top_k=3)
     retrieve_time = (time.time() - retrieve_start) * 1000
 
     # Compose
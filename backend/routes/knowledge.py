@@ -1,8 +1,10 @@
-import time
-from fastapi import APIRouter
+import json, time
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 import backend.variables.global_states as global_state
 from backend.models.knowledge_input import KnowledgeInput
-from backend.services.utils import rebuild_index
+from backend.services.utils import upsert_document, upsert_documents, rebuild_index_in_background
 
 router = APIRouter()
 
@@ -21,26 +23,109 @@ def upsert_knowledge(payload: KnowledgeInput):
     # Check if updating existing doc
     is_new = doc_id not in global_state.documents
 
-    # Upsert document
-    global_state.documents[doc_id] = {
-        "id": doc_id,
-        "text": text,
-        "tags": tags
-    }
-
-    # Rebuild global_state.index (acceptable for small datasets)
-    rebuild_index()
+    # Upsert document and update indexes incrementally (only this doc is encoded)
+    upsert_document(doc_id, text, tags)
 
     latency = (time.time() - start) * 1000
 
     return {
         "ok": True,
-        "chunks": 1,
+        "chunks": len(global_state.doc_chunks.get(doc_id, [])),
         "is_new": is_new,
         "total_docs": len(global_state.documents),
         "latency_ms": round(latency, 2)
     }
 
+async def _iter_bulk_items(request: Request):
+    """Yield (line_no, raw_item) from a JSON array body or an NDJSON stream"""
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        line_no = 0
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_no += 1
+                if line.strip():
+                    yield line_no, line
+        if buffer.strip():
+            yield line_no + 1, buffer
+        return
+
+    try:
+        items = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON stream")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON stream")
+    for line_no, item in enumerate(items, 1):
+        yield line_no, item
+
+@router.post("/knowledge/bulk")
+async def bulk_upsert_knowledge(request: Request, batch_size: int = 512):
+    """
+    Bulk upsert documents from a JSON array or an NDJSON stream
+    (Content-Type: application/x-ndjson). Texts are embedded in large batches
+    and the indexes are updated once per `batch_size` documents.
+    """
+    start = time.time()
+    batch_size = max(1, batch_size)
+
+    batches = []
+    errors = []
+    pending = []
+
+    async def flush():
+        stats = await run_in_threadpool(upsert_documents, pending.copy())
+        elapsed_s = stats["total_ms"] / 1000
+        stats["batch"] = len(batches) + 1
+        stats["docs_per_s"] = round(stats["docs"] / elapsed_s, 1) if elapsed_s > 0 else None
+        batches.append(stats)
+        pending.clear()
+
+    async for line_no, raw in _iter_bulk_items(request):
+        try:
+            item = json.loads(raw) if isinstance(raw, bytes) else raw
+            doc = KnowledgeInput(**item)
+        except (ValueError, TypeError, ValidationError) as e:
+            errors.append({"line": line_no, "error": str(e)})
+            continue
+
+        pending.append({"id": doc.id, "text": doc.text, "tags": doc.tags})
+        if len(pending) >= batch_size:
+            await flush()
+
+    if pending:
+        await flush()
+
+    total_docs = sum(b["docs"] for b in batches)
+    latency = (time.time() - start) * 1000
+
+    return {
+        "ok": not errors,
+        "ingested": total_docs,
+        "errors": errors,
+        "batches": batches,
+        "total_docs": len(global_state.documents),
+        "docs_per_s": round(total_docs / (latency / 1000), 1) if latency > 0 else None,
+        "latency_ms": round(latency, 2)
+    }
+
+@router.post("/knowledge/reindex", status_code=202)
+def reindex_knowledge():
+    """
+    Rebuild every index from scratch in the background. Queries keep being
+    served from the current indexes and switch over once the new ones are built.
+    """
+    started = rebuild_index_in_background()
+    return {
+        "ok": True,
+        "started": started,  # False: a rebuild is already running
+        "total_docs": len(global_state.documents)
+    }
+
 @router.get("/knowledge")
 def list_knowledge():
     """List all global_state.documents"""
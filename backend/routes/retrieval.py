@@ -0,0 +1,35 @@
+import time
+from fastapi import APIRouter
+import backend.variables.global_states as global_state
+from backend.models.retrieve_input import RetrieveBatchInput
+from backend.services.concurrency import run_in_retrieval_pool
+from backend.services.utils import retrieve_batch
+
+router = APIRouter()
+
+@router.post("/retrieve/batch")
+async def retrieve_batch_endpoint(payload: RetrieveBatchInput):
+    """
+    Retrieve for many queries in one request (offline evaluation, cache pre-warming).
+    Queries are encoded in one model call and searched with one FAISS call per slice;
+    results are returned in query order with per-stage timings for the whole batch.
+    """
+    if global_state.retriever is None:
+        return {"error": "Retriever not initialized"}
+
+    search_params = {
+        k: v for k, v in {"ef_search": payload.ef_search, "nprobe": payload.nprobe}.items() if v is not None
+    }
+    start = time.time()
+    results, stats = await run_in_retrieval_pool(
+        retrieve_batch, payload.queries, payload.top_k, payload.include_tags, payload.exclude_tags, search_params
+    )
+    latency = (time.time() - start) * 1000
+
+    return {
+        "count": len(results),
+        "results": [{"query": query, "results": docs} for query, docs in zip(payload.queries, results)],
+        **stats,
+        "latency_ms": round(latency, 2),
+        "queries_per_s": round(len(results) / (latency / 1000), 1) if latency else 0.0
+    }
@@ -1,24 +1,31 @@
+import base64
+import json
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+import aiosqlite
 from backend.services.database import db_service
+from backend.services.id_allocator import BlockIdAllocator
 
 
-# Keep appt_counter for generating IDs
-appt_counter = 1000
+# Appointment ids are leased in blocks from the database, so they survive
+# restarts and never collide between worker processes
+appt_ids = BlockIdAllocator(db_service, "appointment")
 session_context: Dict[str, str] = {}  # session_id → last_appt_id
 
 
-def get_next_appt_id() -> str:
+async def get_next_appt_id() -> str:
     """Generate next appointment ID"""
-    global appt_counter
-    appt_id = f"A-{appt_counter}"
-    appt_counter += 1
-    return appt_id
+    return f"A-{await appt_ids.allocate()}"
+
+
+async def get_next_appt_ids(count: int) -> List[str]:
+    """Generate `count` appointment IDs (a batch usually costs no database round trip)"""
+    return [f"A-{value}" for value in await appt_ids.allocate_many(count)]
 
 
 async def schedule_appointment(params: dict, session_id: Optional[str] = None) -> dict:
     """
-    Schedule a new appointment (idempotent)
+    Schedule a new appointment (idempotent; same rules as schedule_appointments)
 
     Args:
         params: {
@@ -34,15 +41,17 @@ async def schedule_appointment(params: dict, session_id: Optional[str] = None) -
             "ok": bool,
             "appt_id": str,
             "normalized_slot_iso": str,
-            "status": "created" | "already_booked"
+            "status": "created" | "already_booked" | "conflict"
         }
+        conflict (ok=False, appt_id=None): the patient is booked at that slot at
+        another location, given as "conflicting_appt_id"
     """
     patient = params.get("patient", "Unknown").strip()
     slot = params.get("preferred_slot_iso", "")
     location = params.get("location", "Main").strip()
     notes = params.get("notes")
     
-    appt_id = get_next_appt_id()
+    appt_id = await get_next_appt_id()
     
     result = await db_service.create_appointment(
         appointment_id=appt_id,
@@ -53,25 +62,96 @@ async def schedule_appointment(params: dict, session_id: Optional[str] = None) -
     )
     
     # Track in session
-    if session_id and "appt_id" in result:
+    if session_id and result["appt_id"]:
         session_context[session_id] = result["appt_id"]
     
     return result
 
 
+async def schedule_appointments(items: List[dict]) -> dict:
+    """
+    Schedule many appointments in one transaction (bulk imports, recurring schedules)
+
+    Args:
+        items: list of schedule_appointment params
+
+    Returns:
+        {
+            "results": [{"ok", "appt_id", "normalized_slot_iso", "status"}] in input order,
+                       status "created" | "already_booked" | "conflict"
+                       (conflict results carry "conflicting_appt_id"),
+            "created": int,
+            "already_booked": int,
+            "conflict": int
+        }
+    """
+    rows = [
+        {
+            "id": appt_id,
+            "patient": item.get("patient", "Unknown").strip(),
+            "slot": item.get("preferred_slot_iso", ""),
+            "location": item.get("location", "Main").strip(),
+            "notes": item.get("notes")
+        }
+        for appt_id, item in zip(await get_next_appt_ids(len(items)), items)
+    ]
+    results = await db_service.create_appointments(rows) if rows else []
+
+    summary = {"results": results, "created": 0, "already_booked": 0, "conflict": 0}
+    for result in results:
+        summary[result["status"]] += 1
+    return summary
+
+
 async def get_appointment(appt_id: str) -> Optional[Dict]:
     """Get a single appointment by ID"""
     return await db_service.get_appointment(appt_id)
 
 
-async def get_all_appointments() -> dict:
-    """Get all appointments"""
-    appointments_list = await db_service.get_all_appointments()
-    total = await db_service.get_appointments_count()
+def encode_cursor(appointment: dict) -> str:
+    """Opaque page cursor: the (created_at, id) position of the last appointment on a page"""
+    position = json.dumps([appointment["created_at"], appointment["id"]])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        created_at, appt_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(created_at, str) or not isinstance(appt_id, str):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return created_at, appt_id
+
+
+async def get_all_appointments(limit: int = 100, cursor: Optional[str] = None, status: Optional[str] = None,
+                               location: Optional[str] = None, patient: Optional[str] = None,
+                               slot_from: Optional[str] = None, slot_to: Optional[str] = None) -> dict:
+    """
+    Get one page of appointments, newest first
+
+    Returns:
+        {
+            "appointments": list,
+            "next_cursor": str | None (pass back as `cursor` for the next page),
+            "total": int (all appointments),
+            "counts": {status: int}
+        }
+    """
+    after = decode_cursor(cursor) if cursor else None
+    # One extra row tells whether another page follows
+    appointments_list = await db_service.list_appointments(
+        limit + 1, after, status=status, location=location, patient=patient, slot_from=slot_from, slot_to=slot_to
+    )
+    next_cursor = encode_cursor(appointments_list[limit - 1]) if len(appointments_list) > limit else None
+    counts = await db_service.get_appointment_counts()
     
     return {
-        "appointments": appointments_list,
-        "total": total
+        "appointments": appointments_list[:limit],
+        "next_cursor": next_cursor,
+        "total": sum(counts.values()),
+        "counts": counts
     }
 
 
@@ -86,7 +166,9 @@ async def update_appointment(appt_id: str, updates: dict) -> dict:
     Returns:
         {
             "ok": bool,
-            "appointment": dict | None
+            "appointment": dict | None,
+            "conflict": bool (only when the change would duplicate an active booking),
+            "error": str (with conflict)
         }
     """
     # Map API field names to database field names
@@ -102,7 +184,16 @@ async def update_appointment(appt_id: str, updates: dict) -> dict:
     if "status" in updates:
         db_updates["status"] = updates["status"]
     
-    appointment = await db_service.update_appointment(appt_id, **db_updates)
+    try:
+        appointment = await db_service.update_appointment(appt_id, **db_updates)
+    except aiosqlite.IntegrityError:
+        # Unique booking key: another active appointment has this patient, slot and location
+        return {
+            "ok": False,
+            "appointment": None,
+            "conflict": True,
+            "error": "That patient already has an appointment at this slot and location"
+        }
     
     return {
         "ok": appointment is not None,
@@ -1,11 +1,17 @@
 # auth.py - simple JWT helpers for demo
+import time
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 
+from backend.services.lru_cache import LRUCache
+
 SECRET_KEY = "replace_this_with_a_strong_secret"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Verified token -> payload, so reconnects skip the signature check (never outlives the token)
+verified_tokens = LRUCache(capacity=1024, ttl=60)
+
 def create_access_token(data: dict, expires_delta: int = ACCESS_TOKEN_EXPIRE_MINUTES):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=expires_delta)
@@ -14,8 +20,13 @@ def create_access_token(data: dict, expires_delta: int = ACCESS_TOKEN_EXPIRE_MIN
     return encoded_jwt
 
 def verify_token(token: str):
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+    ttl = min(verified_tokens.ttl, payload["exp"] - time.time()) if "exp" in payload else None
+    verified_tokens.set(token, payload, ttl=ttl)
+    return payload
\ No newline at end of file
@@ -0,0 +1,78 @@
+import re
+from typing import List
+
+from backend.variables.settings import CHUNK_MODE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP
+
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def _token_windows(words: List[str], max_tokens: int, overlap: int) -> List[str]:
+    """Fixed-size windows of words, consecutive windows sharing `overlap` words"""
+    stride = max(1, max_tokens - overlap)
+    chunks = []
+    for start in range(0, len(words), stride):
+        chunks.append(' '.join(words[start:start + max_tokens]))
+        if start + max_tokens >= len(words):
+            break
+    return chunks
+
+
+def _sentence_chunks(text: str, max_tokens: int, overlap: int) -> List[str]:
+    """Pack whole sentences into chunks; trailing sentences (up to `overlap` words) repeat in the next chunk"""
+    chunks = []
+    current: List[List[str]] = []  # sentences (as word lists) in the open chunk
+    current_len = 0
+
+    for sentence in SENTENCE_RE.split(text):
+        words = sentence.split()
+        if not words:
+            continue
+
+        if len(words) > max_tokens:
+            # A single over-long sentence falls back to token windows
+            if current:
+                chunks.append(' '.join(w for s in current for w in s))
+                current, current_len = [], 0
+            chunks.extend(_token_windows(words, max_tokens, overlap))
+            continue
+
+        if current and current_len + len(words) > max_tokens:
+            chunks.append(' '.join(w for s in current for w in s))
+
+            # Carry the tail of the previous chunk over as context
+            carried, carried_len = [], 0
+            for prev in reversed(current):
+                if carried_len + len(prev) > overlap or carried_len + len(prev) + len(words) > max_tokens:
+                    break
+                carried.insert(0, prev)
+                carried_len += len(prev)
+            current, current_len = carried, carried_len
+
+        current.append(words)
+        current_len += len(words)
+
+    if current:
+        chunks.append(' '.join(w for s in current for w in s))
+    return chunks
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP,
+               mode: str = CHUNK_MODE) -> List[str]:
+    """
+    Split a document into retrieval chunks.
+    mode="sentence" packs sentences up to max_tokens; mode="token" uses sliding word windows.
+    Documents that already fit return a single chunk with the original text.
+    """
+    words = text.split()
+    if len(words) <= max_tokens:
+        return [text.strip()] if words else []
+
+    overlap = min(overlap, max_tokens - 1)
+    if mode == "token":
+        return _token_windows(words, max_tokens, overlap)
+    return _sentence_chunks(text, max_tokens, overlap)
+
+
+def chunk_id(doc_id: str, position: int) -> str:
+    """Chunk ids are `<doc_id>#<position>`"""
+    return f"{doc_id}#{position}"
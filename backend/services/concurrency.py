@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Optional
+
+from backend.variables.settings import RETRIEVAL_WORKERS, RETRIEVAL_MAX_CONCURRENCY
+
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer. Writers are preferred so a steady
+    stream of searches cannot starve an index update.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read_lock(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write_lock(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+# Dedicated pool so blocking retrieval never competes with FastAPI's default threadpool.
+# Created per app lifespan: a shut-down executor can't be reused, and the semaphore
+# belongs to the event loop it was first used on.
+_retrieval_executor: Optional[ThreadPoolExecutor] = None
+_retrieval_slots: Optional[asyncio.Semaphore] = None
+
+
+def start_retrieval_pool():
+    """Create the retrieval pool; called on app startup (and lazily on first use)"""
+    global _retrieval_executor, _retrieval_slots
+    _retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+    _retrieval_slots = asyncio.Semaphore(RETRIEVAL_MAX_CONCURRENCY)
+
+
+async def run_in_retrieval_pool(fn, *args, **kwargs):
+    """Run a blocking retrieval call on the retrieval pool without blocking the event loop"""
+    if _retrieval_executor is None:
+        start_retrieval_pool()
+    async with _retrieval_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_retrieval_executor, partial(fn, *args, **kwargs))
+
+
+def shutdown_retrieval_pool():
+    global _retrieval_executor, _retrieval_slots
+    if _retrieval_executor is not None:
+        _retrieval_executor.shutdown(wait=False, cancel_futures=True)
+    _retrieval_executor = None
+    _retrieval_slots = None
@@ -1,137 +1,452 @@
+import asyncio
 import aiosqlite
 import json
+import sqlite3
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from pathlib import Path
+from backend.variables.settings import (
+    DB_READERS, DB_SYNCHRONOUS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_BUSY_TIMEOUT_MS, DB_STATEMENT_CACHE
+)
 
 
 # Database file path
 DB_PATH = "backend/appointments.db"
 
+# Oldest SQLite the schema runs on: generated columns (3.31) and RETURNING (3.35)
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+# Columns returned to callers (booking_key is internal)
+APPOINTMENT_COLUMNS = "id, patient, slot, location, notes, status, created_at, updated_at, cancelled_at"
+
+# Active appointments holding a requested (patient, slot), one row per match; {requests}
+# is a relation of (pos, patient, slot, location). Every booking path resolves its
+# requests with it (DatabaseService._existing_booking): a patient is in one place at a time.
+SLOT_BOOKINGS = """
+    SELECT r.pos, a.id, a.slot,
+           a.booking_key = lower(r.patient) || '|' || r.slot || '|' || lower(r.location) AS same_booking
+    FROM {requests} r
+    JOIN appointments a
+      ON lower(a.patient) = lower(r.patient) AND a.slot = r.slot AND a.status != 'cancelled'
+"""
+
+# Schema migrations, applied in order; PRAGMA user_version records how many have run.
+# Never edit a released step: append a new one.
+MIGRATIONS = [
+    # 1: base table (a no-op on databases created before versioning)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS appointments (
+            id TEXT PRIMARY KEY,
+            patient TEXT NOT NULL,
+            slot TEXT NOT NULL,
+            location TEXT NOT NULL,
+            notes TEXT,
+            status TEXT NOT NULL DEFAULT 'scheduled',
+            created_at TEXT NOT NULL,
+            updated_at TEXT,
+            cancelled_at TEXT
+        )
+        """,
+    ),
+    # 2: booking key (patient, slot, location; case-insensitive) unique among active
+    # appointments, replacing the booked_slots side table; indexes for listing.
+    # Upgrading permanently cancels duplicate active bookings (all but the oldest per key).
+    (
+        """
+        ALTER TABLE appointments ADD COLUMN booking_key TEXT
+        GENERATED ALWAYS AS (lower(patient) || '|' || slot || '|' || lower(location)) VIRTUAL
+        """,
+        # booked_slots was case-insensitive but the duplicate lookup was not, so older
+        # databases can hold several active bookings per key: keep the first one
+        """
+        UPDATE appointments
+        SET status = 'cancelled',
+            cancelled_at = strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'),
+            updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')
+        WHERE status != 'cancelled' AND rowid NOT IN (
+            SELECT min(rowid) FROM appointments WHERE status != 'cancelled' GROUP BY booking_key
+        )
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_booking_key
+        ON appointments (booking_key) WHERE status != 'cancelled'
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_appointments_created_at ON appointments (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_status_created_at ON appointments (status, created_at, id)",
+        "DROP TABLE IF EXISTS booked_slots",
+    ),
+    # 3: per-status counts kept current by triggers (listing never runs COUNT(*)),
+    # and an index for the patient filter
+    (
+        """
+        CREATE TABLE IF NOT EXISTS appointment_counts (
+            status TEXT PRIMARY KEY,
+            n INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        INSERT INTO appointment_counts (status, n)
+        SELECT status, COUNT(*) FROM appointments GROUP BY status
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS appointments_count_insert AFTER INSERT ON appointments
+        BEGIN
+            INSERT INTO appointment_counts (status, n) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET n = n + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS appointments_count_delete AFTER DELETE ON appointments
+        BEGIN
+            UPDATE appointment_counts SET n = n - 1 WHERE status = OLD.status;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS appointments_count_status AFTER UPDATE OF status ON appointments
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE appointment_counts SET n = n - 1 WHERE status = OLD.status;
+            INSERT INTO appointment_counts (status, n) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET n = n + 1;
+        END
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (lower(patient), created_at, id)",
+    ),
+    # 4: durable id sequences, leased to processes in blocks (BlockIdAllocator);
+    # the appointment sequence starts past every A-<n> id already stored
+    (
+        """
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            name TEXT PRIMARY KEY,
+            next_value INTEGER NOT NULL
+        )
+        """,
+        """
+        INSERT OR IGNORE INTO id_sequences (name, next_value)
+        SELECT 'appointment', max(1000, coalesce(max(CAST(substr(id, 3) AS INTEGER)) + 1, 1000))
+        FROM appointments WHERE id GLOB 'A-[0-9]*'
+        """,
+    ),
+]
+
 
 class DatabaseService:
-    """Service for managing SQLite database operations for appointments"""
+    """
+    Service for managing SQLite database operations for appointments.
+    Connections are long-lived: one writer (writes are serialized anyway in
+    SQLite) and a pool of readers, which WAL mode lets run alongside it.
+    """
 
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, readers: int = DB_READERS):
         self.db_path = db_path
+        self.readers = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._reader_pool: Optional[asyncio.Queue] = None  # idle reader connections
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
 
+    async def _connect(self, readonly: bool = False) -> aiosqlite.Connection:
+        """Open one connection with the pool's pragmas (statements stay prepared per connection)"""
+        db = await aiosqlite.connect(self.db_path, cached_statements=DB_STATEMENT_CACHE)
+        db.row_factory = aiosqlite.Row
+        await db.executescript(f"""
+            PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS};
+            PRAGMA synchronous = {DB_SYNCHRONOUS};
+            PRAGMA cache_size = -{DB_CACHE_SIZE_KB};
+            PRAGMA mmap_size = {DB_MMAP_SIZE};
+            PRAGMA temp_store = MEMORY;
+            PRAGMA query_only = {"ON" if readonly else "OFF"};
+        """)
+        return db
+
+    async def open(self):
+        """Open the writer and reader connections (idempotent)"""
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+                raise RuntimeError(
+                    f"SQLite {sqlite3.sqlite_version} is too old for the appointments schema, "
+                    f"need {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer"
+                )
+            writer = await self._connect()
+            # WAL is persistent in the file: readers no longer block the writer or each other
+            await writer.executescript("PRAGMA journal_mode = WAL;")
+            readers = [await self._connect(readonly=True) for _ in range(self.readers)]
+            pool = asyncio.Queue()
+            for db in readers:
+                pool.put_nowait(db)
+            self._writer, self._reader_conns, self._reader_pool = writer, readers, pool
+
+    async def close(self):
+        """Close every pooled connection (the last one out checkpoints the WAL)"""
+        async with self._open_lock:
+            if self._writer is None:
+                return
+            for db in self._reader_conns:
+                await db.close()
+            await self._writer.close()
+            self._writer, self._reader_conns, self._reader_pool = None, [], None
+
+    # Pooled connections are never closed between requests, so every cursor is closed
+    # as soon as it is read (`async with`, or `_run` for statements without rows): an
+    # open statement would pin a stale WAL read snapshot (or a write lock) on the connection.
+
+    @staticmethod
+    async def _run(db: aiosqlite.Connection, sql: str, parameters=(), many: bool = False) -> int:
+        """Execute a statement that returns no rows, close its cursor, return the affected row count"""
+        async with (db.executemany(sql, parameters) if many else db.execute(sql, parameters)) as cursor:
+            return cursor.rowcount
+
+    @asynccontextmanager
+    async def _reader(self):
+        """Borrow a reader connection from the pool"""
+        if self._writer is None:
+            await self.open()
+        db = await self._reader_pool.get()
+        try:
+            yield db
+        finally:
+            self._reader_pool.put_nowait(db)
+
+    @asynccontextmanager
+    async def _transaction(self, immediate: bool = False):
+        """
+        Exclusive use of the writer connection; commits on success, rolls back on error.
+        `immediate` takes SQLite's write lock up front, so what the transaction reads
+        cannot be changed by other processes before it writes.
+        """
+        if self._writer is None:
+            await self.open()
+        async with self._write_lock:
+            try:
+                if immediate:
+                    await self._run(self._writer, "BEGIN IMMEDIATE")
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
     async def init_db(self):
-        """Initialize the database and create tables if they don't exist"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS appointments (
-                    id TEXT PRIMARY KEY,
+        """Open the connection pool and bring the schema up to date"""
+        await self.open()
+        async with self._write_lock:
+            version = await self._migrate(self._writer)
+        print(f"✅ Database initialized at {self.db_path} (schema v{version}, {self.readers} readers, WAL)")
+
+    async def _migrate(self, db: aiosqlite.Connection) -> int:
+        """
+        Apply pending MIGRATIONS, each in its own transaction together with its
+        user_version bump. BEGIN IMMEDIATE takes the write lock before the version
+        is read, so several workers starting at once never apply a step twice.
+        """
+        while True:
+            await self._run(db, "BEGIN IMMEDIATE")
+            try:
+                async with db.execute("PRAGMA user_version") as cursor:
+                    version = (await cursor.fetchone())[0]
+                if version >= len(MIGRATIONS):
+                    await db.commit()
+                    return version
+                for statement in MIGRATIONS[version]:
+                    await self._run(db, statement)
+                await self._run(db, f"PRAGMA user_version = {version + 1}")
+                await db.commit()
+            except BaseException:
+                await db.rollback()
+                raise
+            print(f"✅ Applied database migration {version + 1}")
+
+    @staticmethod
+    def _existing_booking(matches, slot: str) -> Optional[Dict]:
+        """
+        Result for a request whose (patient, slot) is already held, given its
+        SLOT_BOOKINGS rows: "already_booked" when one has the same booking key
+        (patient, slot, location; case-insensitive), "conflict" when the patient
+        is booked at another location. None when the slot is free.
+        """
+        for row in matches:
+            if row["same_booking"]:
+                return {"ok": True, "appt_id": row["id"], "normalized_slot_iso": row["slot"], "status": "already_booked"}
+        if matches:
+            return {"ok": False, "appt_id": None, "conflicting_appt_id": matches[0]["id"],
+                    "normalized_slot_iso": slot, "status": "conflict"}
+        return None
+
+    async def create_appointment(self, appointment_id: str, patient: str, slot: str, location: str, notes: Optional[str] = None) -> Dict:
+        """
+        Create a new appointment. Returns the active one with the same booking key
+        instead ("already_booked"), or a "conflict" when the patient is booked at
+        that slot at another location. The lookup is one probe of the patient index;
+        the transaction takes the write lock first, so no other process books in between.
+        """
+        async with self._transaction(immediate=True) as db:
+            async with db.execute(SLOT_BOOKINGS.format(requests="(SELECT 0 AS pos, ? AS patient, ? AS slot, ? AS location)"),
+                                  (patient, slot, location)) as cursor:
+                existing = self._existing_booking(await cursor.fetchall(), slot)
+            if existing is not None:
+                return existing
+
+            await self._run(db, """
+                INSERT INTO appointments (id, patient, slot, location, notes, status, created_at)
+                VALUES (?, ?, ?, ?, ?, 'scheduled', ?)
+            """, (appointment_id, patient, slot, location, notes or "", datetime.now().isoformat()))
+
+        return {
+            "ok": True,
+            "appt_id": appointment_id,
+            "normalized_slot_iso": slot,
+            "status": "created"
+        }
+
+    async def create_appointments(self, appointments: List[Dict]) -> List[Dict]:
+        """
+        Create many appointments ({id, patient, slot, location, notes}) in one
+        transaction, with one fsync for the whole batch. Per item, in order:
+        - "already_booked": an active appointment (or an earlier item) has its booking key
+        - "conflict": the patient is already booked at that slot at another location
+        - "created": inserted (all new rows go in with a single executemany)
+        Items are resolved like create_appointment, earlier items of the batch counting as booked.
+        """
+        now = datetime.now().isoformat()
+        async with self._transaction(immediate=True) as db:
+            # Stage the batch so existing bookings are found with one indexed join
+            await self._run(db, """
+                CREATE TEMP TABLE IF NOT EXISTS batch_appointments (
+                    pos INTEGER PRIMARY KEY,
                     patient TEXT NOT NULL,
                     slot TEXT NOT NULL,
-                    location TEXT NOT NULL,
-                    notes TEXT,
-                    status TEXT NOT NULL DEFAULT 'scheduled',
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT,
-                    cancelled_at TEXT
+                    location TEXT NOT NULL
                 )
             """)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS booked_slots (
-                    patient_lower TEXT NOT NULL,
-                    slot TEXT NOT NULL,
-                    location_lower TEXT NOT NULL,
-                    PRIMARY KEY (patient_lower, slot, location_lower)
-                )
-            """)
-            await db.commit()
-            print(f"✅ Database initialized at {self.db_path}")
+            await self._run(db, "DELETE FROM temp.batch_appointments")
+            await self._run(
+                db, "INSERT INTO temp.batch_appointments (pos, patient, slot, location) VALUES (?, ?, ?, ?)",
+                [(pos, a["patient"], a["slot"], a["location"]) for pos, a in enumerate(appointments)], many=True
+            )
+            matches = {}  # pos -> SLOT_BOOKINGS rows
+            async with db.execute(SLOT_BOOKINGS.format(requests="temp.batch_appointments")) as cursor:
+                for row in await cursor.fetchall():
+                    matches.setdefault(row["pos"], []).append(row)
 
-    async def create_appointment(self, appointment_id: str, patient: str, slot: str, location: str, notes: Optional[str] = None) -> Dict:
-        """Create a new appointment"""
-        patient_lower = patient.lower()
-        location_lower = location.lower()
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            # Check if slot is already booked
-            cursor = await db.execute("""
-                SELECT 1 FROM booked_slots 
-                WHERE patient_lower = ? AND slot = ? AND location_lower = ?
-            """, (patient_lower, slot, location_lower))
-            existing = await cursor.fetchone()
-            
-            if existing:
-                # Return existing appointment
-                cursor = await db.execute("""
-                    SELECT * FROM appointments 
-                    WHERE patient = ? AND slot = ? AND location = ?
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                """, (patient, slot, location))
-                row = await cursor.fetchone()
-                if row:
-                    return {
-                        "ok": True,
-                        "appt_id": row[0],
-                        "normalized_slot_iso": row[2],
-                        "status": "already_booked"
-                    }
-            
-            # Create new appointment
-            now = datetime.now().isoformat()
-            await db.execute("""
+            results = []
+            rows = []
+            batch_slots = {}  # (patient, slot) -> (id, location) of the row created for it in this batch
+            for pos, a in enumerate(appointments):
+                slot_key = (a["patient"].lower(), a["slot"])
+                held = matches.get(pos, [])
+                if slot_key in batch_slots:
+                    appt_id, location = batch_slots[slot_key]
+                    held = held + [{"id": appt_id, "slot": a["slot"], "same_booking": location == a["location"].lower()}]
+                existing = self._existing_booking(held, a["slot"])
+                if existing is not None:
+                    results.append(existing)
+                else:
+                    batch_slots[slot_key] = (a["id"], a["location"].lower())
+                    rows.append((a["id"], a["patient"], a["slot"], a["location"], a.get("notes") or "", now))
+                    results.append({"ok": True, "appt_id": a["id"],
+                                    "normalized_slot_iso": a["slot"], "status": "created"})
+
+            await self._run(db, """
                 INSERT INTO appointments (id, patient, slot, location, notes, status, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (appointment_id, patient, slot, location, notes or "", "scheduled", now))
-            
-            # Add to booked_slots
-            try:
-                await db.execute("""
-                    INSERT INTO booked_slots (patient_lower, slot, location_lower)
-                    VALUES (?, ?, ?)
-                """, (patient_lower, slot, location_lower))
-            except aiosqlite.IntegrityError:
-                pass  # Already booked
-            
-            await db.commit()
-            
-            return {
-                "ok": True,
-                "appt_id": appointment_id,
-                "normalized_slot_iso": slot,
-                "status": "created"
-            }
+                VALUES (?, ?, ?, ?, ?, 'scheduled', ?)
+            """, rows, many=True)
+            await self._run(db, "DELETE FROM temp.batch_appointments")
+
+        return results
+
+    async def reserve_ids(self, sequence: str, count: int) -> Tuple[int, int]:
+        """
+        Lease `count` consecutive values of an id sequence: returns [start, end).
+        A single UPDATE ... RETURNING, so concurrent processes always get disjoint ranges.
+        """
+        async with self._transaction() as db:
+            async with db.execute("""
+                UPDATE id_sequences SET next_value = next_value + ?
+                WHERE name = ?
+                RETURNING next_value
+            """, (count, sequence)) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            raise KeyError(f"Unknown id sequence: {sequence}")
+        return row[0] - count, row[0]
 
     async def get_appointment(self, appointment_id: str) -> Optional[Dict]:
         """Get a single appointment by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
-                SELECT * FROM appointments WHERE id = ?
-            """, (appointment_id,))
-            row = await cursor.fetchone()
+        async with self._reader() as db:
+            async with db.execute(f"""
+                SELECT {APPOINTMENT_COLUMNS} FROM appointments WHERE id = ?
+            """, (appointment_id,)) as cursor:
+                row = await cursor.fetchone()
             
             if row:
                 return dict(row)
             return None
 
-    async def get_all_appointments(self, limit: int = 100, offset: int = 0) -> List[Dict]:
-        """Get all appointments with pagination"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
-                SELECT * FROM appointments 
-                ORDER BY created_at DESC
-                LIMIT ? OFFSET ?
-            """, (limit, offset))
-            rows = await cursor.fetchall()
+    async def list_appointments(self, limit: int = 100, after: Optional[Tuple[str, str]] = None,
+                                status: Optional[str] = None, location: Optional[str] = None,
+                                patient: Optional[str] = None, slot_from: Optional[str] = None,
+                                slot_to: Optional[str] = None) -> List[Dict]:
+        """
+        Appointments newest first, keyset-paginated: `after` is the (created_at, id)
+        of the last row of the previous page, so every page is an index range scan
+        no matter how deep it is. Patient and location match case-insensitively;
+        the slot range is [slot_from, slot_to).
+        """
+        clauses = []
+        params = []
+        if after is not None:
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(after)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if location:
+            clauses.append("lower(location) = lower(?)")
+            params.append(location)
+        if patient:
+            clauses.append("lower(patient) = lower(?)")
+            params.append(patient)
+        if slot_from:
+            clauses.append("slot >= ?")
+            params.append(slot_from)
+        if slot_to:
+            clauses.append("slot < ?")
+            params.append(slot_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+
+        async with self._reader() as db:
+            async with db.execute(f"""
+                SELECT {APPOINTMENT_COLUMNS} FROM appointments
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, params) as cursor:
+                rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
+    async def get_appointment_counts(self) -> Dict[str, int]:
+        """Number of appointments per status (trigger-maintained, no table scan)"""
+        async with self._reader() as db:
+            async with db.execute("SELECT status, n FROM appointment_counts WHERE n > 0") as cursor:
+                rows = await cursor.fetchall()
+            return {row["status"]: row["n"] for row in rows}
+
     async def get_appointments_count(self) -> int:
         """Get total count of appointments"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT COUNT(*) FROM appointments")
-            row = await cursor.fetchone()
-            return row[0] if row else 0
+        return sum((await self.get_appointment_counts()).values())
 
     async def update_appointment(self, appointment_id: str, **updates) -> Optional[Dict]:
-        """Update an appointment"""
+        """
+        Update an appointment. Raises aiosqlite.IntegrityError when the change would
+        make it a second active appointment with the same booking key.
+        """
         # Build update query dynamically
         update_fields = []
         values = []
@@ -151,76 +466,44 @@ class DatabaseService:
         
         values.append(appointment_id)
         
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(f"""
+        async with self._transaction() as db:
+            # RETURNING hands back the updated row without a second query
+            async with db.execute(f"""
                 UPDATE appointments 
                 SET {', '.join(update_fields)}
                 WHERE id = ?
-            """, values)
-            
-            await db.commit()
+                RETURNING {APPOINTMENT_COLUMNS}
+            """, values) as cursor:
+                row = await cursor.fetchone()
             
-            if cursor.rowcount > 0:
-                return await self.get_appointment(appointment_id)
-            return None
+        return dict(row) if row else None
 
     async def delete_appointment(self, appointment_id: str) -> bool:
         """Delete an appointment"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # First get the appointment to remove from booked_slots
-            appointment = await self.get_appointment(appointment_id)
-            if not appointment:
-                return False
-            
-            # Remove from booked_slots
-            patient_lower = appointment['patient'].lower()
-            location_lower = appointment['location'].lower()
-            await db.execute("""
-                DELETE FROM booked_slots 
-                WHERE patient_lower = ? AND slot = ? AND location_lower = ?
-            """, (patient_lower, appointment['slot'], location_lower))
-            
-            # Delete appointment
-            cursor = await db.execute("DELETE FROM appointments WHERE id = ?", (appointment_id,))
-            await db.commit()
-            
-            return cursor.rowcount > 0
+        async with self._transaction() as db:
+            deleted = await self._run(db, "DELETE FROM appointments WHERE id = ?", (appointment_id,))
+        return deleted > 0
 
     async def cancel_appointment(self, appointment_id: str) -> Optional[Dict]:
         """Cancel an appointment (soft delete)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
+        now = datetime.now().isoformat()
+        async with self._transaction() as db:
+            async with db.execute(f"""
                 UPDATE appointments 
                 SET status = ?, cancelled_at = ?, updated_at = ?
                 WHERE id = ?
-            """, ("cancelled", datetime.now().isoformat(), datetime.now().isoformat(), appointment_id))
-            
-            await db.commit()
-            
-            if cursor.rowcount > 0:
-                # Remove from booked_slots
-                appointment = await self.get_appointment(appointment_id)
-                if appointment:
-                    patient_lower = appointment['patient'].lower()
-                    location_lower = appointment['location'].lower()
-                    await db.execute("""
-                        DELETE FROM booked_slots 
-                        WHERE patient_lower = ? AND slot = ? AND location_lower = ?
-                    """, (patient_lower, appointment['slot'], location_lower))
-                    await db.commit()
-                
-                return await self.get_appointment(appointment_id)
-            return None
+                RETURNING {APPOINTMENT_COLUMNS}
+            """, ("cancelled", now, now, appointment_id)) as cursor:
+                appointment = await cursor.fetchone()
+
+        # A cancelled appointment leaves the booking-key index, freeing its slot
+        return dict(appointment) if appointment else None
 
     async def clear_all_appointments(self) -> int:
         """Clear all appointments (for testing)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("DELETE FROM appointments")
-            await db.execute("DELETE FROM booked_slots")
-            await db.commit()
-            return cursor.rowcount
+        async with self._transaction() as db:
+            deleted = await self._run(db, "DELETE FROM appointments")
+        return deleted
 
 
 # Global database service instance
@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+import numpy as np
+
+from backend.variables.settings import EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching front for the embedding model.
+    Encode requests from concurrent callers are queued; a single worker thread
+    collects everything arriving within `window_ms` (or up to `max_batch` texts)
+    and runs one batched `model.encode`, then resolves each caller's future with
+    its row. Exposes `encode` with the model's signature so it can stand in for it.
+    """
+
+    def __init__(self, model, window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_MAX_BATCH):
+        self.model = model
+        self.window_s = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue" = queue.Queue()
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.max_queue_depth = 0
+        self.total_wait_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text for encoding; the future resolves to its embedding row"""
+        future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        """Drop-in for model.encode (extra kwargs are ignored); blocks until all rows are ready"""
+        if len(texts) >= self.max_batch:
+            # Already a full batch (e.g. retrieve_batch): queueing would only split it up
+            return self.model.encode(texts, batch_size=self.max_batch, show_progress_bar=False)
+        futures = [self.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures])
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # re-queue shutdown marker for the main loop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._collect(first)
+            texts = [text for text, _, _ in batch]
+            started = time.monotonic()
+            try:
+                embeddings = self.model.encode(texts, batch_size=len(texts), show_progress_bar=False)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.total_wait_ms += sum((started - queued_at) * 1000 for _, _, queued_at in batch)
+            for row, (_, future, _) in zip(embeddings, batch):
+                future.set_result(row)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window_s * 1000,
+            "max_batch": self.max_batch,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "largest_batch": self.largest_batch,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "avg_queue_wait_ms": round(self.total_wait_ms / self.items, 3) if self.items else 0.0
+        }
+
+    def close(self):
+        """Stop the worker after draining already-queued requests"""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
@@ -0,0 +1,160 @@
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from backend.services.lexical_index import BM25Index
+from backend.services.vector_index import VectorIndex
+from backend.variables.settings import (
+    CHUNK_MODE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP, EMBEDDING_MODEL_NAME, INDEX_BACKEND, ANN_MIN_VECTORS,
+    VECTOR_PRECISION
+)
+
+SNAPSHOT_VERSION = 3  # 2: tag bitmaps, 3: documents + publish generation
+DELTA_LOG = "deltas.jsonl"  # upserts published since the snapshot was written, one record per line
+
+
+class SnapshotParts(NamedTuple):
+    index: VectorIndex
+    lexical_index: BM25Index
+    chunks: Dict[str, dict]
+    doc_chunks: Dict[str, List[str]]
+    documents: Dict[str, dict]
+    generation: int = 0  # bumped on every publish, so other workers know to reload
+
+
+@contextmanager
+def snapshot_lock(path: str, shared: bool = False):
+    """
+    Cross-process lock (flock on `<path>.lock`). Exclusive mode serializes snapshot
+    builds and publishes between uvicorn workers: the first worker to take it
+    at startup builds the snapshot, the others find it ready and map it.
+    Shared mode is for readers: a snapshot loaded under it is never swapped
+    out halfway. Not reentrant: a process holding it must not take it again.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def corpus_hash(documents: Dict[str, dict]) -> str:
+    """
+    Content hash of everything that determines the indexes:
+    document contents, embedding model, chunking and index backend settings.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "version": SNAPSHOT_VERSION,
+        "model": EMBEDDING_MODEL_NAME,
+        "chunking": [CHUNK_MODE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP],
+        "index": [INDEX_BACKEND, ANN_MIN_VECTORS, VECTOR_PRECISION]
+    }, sort_keys=True).encode("utf-8"))
+    for doc_id in sorted(documents):
+        h.update(json.dumps(documents[doc_id], sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def save_snapshot(path: str, content_hash: str, parts: SnapshotParts):
+    """
+    Write a snapshot directory. Files are written to a temporary sibling
+    directory first and swapped in, so a crash never leaves a half-written
+    snapshot behind a valid manifest.
+    """
+    start = time.time()
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    parts.index.save(tmp_path)
+    with open(os.path.join(tmp_path, "lexical.pkl"), "wb") as f:
+        pickle.dump(parts.lexical_index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(tmp_path, "chunks.json"), "w") as f:
+        json.dump({"chunks": parts.chunks, "doc_chunks": parts.doc_chunks, "documents": parts.documents}, f)
+
+    # Manifest last: its presence marks the snapshot as complete
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+        json.dump({
+            "version": SNAPSHOT_VERSION,
+            "content_hash": content_hash,
+            "generation": parts.generation,
+            "chunks": len(parts.chunks),
+            "dimension": parts.index.dimension,
+            "created_at": time.time()
+        }, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    print(f"✅ Index snapshot saved to {path} in {(time.time() - start) * 1000:.2f}ms")
+
+
+def read_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def append_delta(path: str, record: dict) -> int:
+    """
+    Append one upsert record to the snapshot's delta log (exclusive snapshot
+    lock held). Returns the log size, i.e. the offset just past the record.
+    A full `save_snapshot` starts a new directory, which truncates the log.
+    """
+    with open(os.path.join(path, DELTA_LOG), "a") as f:
+        f.write(json.dumps(record) + "\n")
+        return f.tell()
+
+
+def delta_log_size(path: str) -> int:
+    try:
+        return os.path.getsize(os.path.join(path, DELTA_LOG))
+    except OSError:
+        return 0
+
+
+def read_deltas(path: str, offset: int = 0) -> Tuple[List[dict], int]:
+    """Delta records after byte `offset`, and the offset past the last complete one"""
+    try:
+        with open(os.path.join(path, DELTA_LOG), "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return [], offset
+    end = data.rfind(b"\n") + 1  # a torn last line (crash mid-append) is not a record
+    return [json.loads(line) for line in data[:end].splitlines() if line], offset + end
+
+
+def load_snapshot(path: str, content_hash: str, mmap: bool = True) -> Optional[SnapshotParts]:
+    """Load a snapshot if it exists and was built from the same content, else None"""
+    manifest = read_manifest(path)
+    if manifest is None:
+        return None
+    if manifest.get("version") != SNAPSHOT_VERSION or manifest.get("content_hash") != content_hash:
+        print("⚠️ Index snapshot is stale, rebuilding")
+        return None
+
+    start = time.time()
+    try:
+        index = VectorIndex.load(path, mmap=mmap)
+        with open(os.path.join(path, "lexical.pkl"), "rb") as f:
+            lexical_index = pickle.load(f)
+        with open(os.path.join(path, "chunks.json")) as f:
+            stored = json.load(f)
+    except (OSError, ValueError, RuntimeError, pickle.UnpicklingError) as e:
+        print(f"⚠️ Failed to load index snapshot: {e}")
+        return None
+
+    print(f"✅ Index snapshot loaded from {path} in {(time.time() - start) * 1000:.2f}ms")
+    return SnapshotParts(
+        index, lexical_index, stored["chunks"], stored["doc_chunks"], stored["documents"], manifest.get("generation", 0)
+    )
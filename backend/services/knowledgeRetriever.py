@@ -1,75 +1,154 @@
-import re
-from typing import List, Tuple, Dict
+import time
+from dataclasses import dataclass, field
+from typing import Any, List, NamedTuple, Tuple, Dict, Optional
 import numpy as np
 import faiss
 
+from backend.services.lexical_index import BM25Index, normalize_text, tokenize
+from backend.services.tag_filter import TagFilter
+from backend.variables.settings import MMR_CANDIDATE_POOL
+
+
+class IndexBundle(NamedTuple):
+    """
+    The indexes one query runs against. Never replaced piecemeal: a full
+    rebuild publishes a new bundle, so swapping it is a single pointer update.
+    """
+    index: Any  # VectorIndex
+    lexical_index: BM25Index
+    documents: Dict[str, dict]  # ids stored in the indexes (chunk ids) -> records
+
+
+@dataclass
+class RetrievalContext:
+    """
+    Per-request state carried through every retrieval stage.
+    Each expensive artifact (normalized text, tokens, query embedding) is computed once.
+    """
+    query: str
+    top_k: int = 3
+    normalized: str = ""
+    tokens: List[str] = field(default_factory=list)
+    query_emb: Optional[np.ndarray] = None
+    search_params: Dict[str, int] = field(default_factory=dict)  # ANN knobs: ef_search, nprobe
+    tag_filter: Optional[TagFilter] = None  # include/exclude tags, applied inside both searches
+    generation: Optional[int] = None  # corpus generation searched; set to use the semantic cache
+    cache_hit: Optional[str] = None  # "semantic" when results came from the semantic cache
+    bundle: Optional[IndexBundle] = None  # indexes pinned for the whole query (set by retrieve)
+    timings: Dict[str, float] = field(default_factory=dict)
+
 
 class HybridRetriever:
     """
     Hybrid retrieval: BM25 (lexical) + FAISS (semantic) with RRF fusion
     """
 
-    def __init__(self, model, index, documents, doc_ids):
+    def __init__(self, model, index, documents, lexical_index=None, embedding_cache=None, semantic_cache=None,
+                 candidate_pool: int = MMR_CANDIDATE_POOL):
         self.model = model
-        self.index = index
-        self.documents = documents
-        self.doc_ids = doc_ids
+        self.bundle = IndexBundle(None, None, documents)
+        # MMR candidate pool; each search stage retrieves at least this deep
+        self.candidate_pool = candidate_pool
+        self.search_depth = max(8, candidate_pool)
+        # Optional LRUCache of normalized query text -> query embedding
+        self.embedding_cache = embedding_cache
+        # Optional SemanticCache of query embedding -> results of a near-identical earlier query
+        self.semantic_cache = semantic_cache
+        self.update_index(index, lexical_index)
+
+    @property
+    def index(self):
+        return self.bundle.index
+
+    @property
+    def lexical_index(self) -> BM25Index:
+        return self.bundle.lexical_index
+
+    @property
+    def documents(self) -> Dict[str, dict]:
+        return self.bundle.documents
+
+    def update_index(self, index, lexical_index=None, documents=None):
+        """
+        Point the retriever at a freshly built VectorIndex / BM25Index pair.
+        `documents` maps the ids stored in the indexes (chunk ids) to records;
+        records carrying a `doc_id` are reported under their parent document.
+        Queries already running keep the bundle they started with. `index` is
+        None while nothing is indexed (empty knowledge base); queries return [].
+        """
+        if documents is None:
+            documents = self.documents
+        if lexical_index is None and index is not None:
+            lexical_index = BM25Index.build(
+                (key, documents[key]["text"], documents[key].get("tags", [])) for key in index.rows
+            )
+        self.bundle = IndexBundle(index, lexical_index, documents)
+
+    def pin(self, ctx: RetrievalContext) -> IndexBundle:
+        """Bundle the query runs against, read once so a concurrent swap is never observed mid-query"""
+        if ctx.bundle is None:
+            ctx.bundle = self.bundle
+        return ctx.bundle
 
     def normalize_query(self, query: str) -> str:
         """Normalize query for better matching"""
-        # Lowercase and remove extra whitespace
-        query = query.lower().strip()
-        query = re.sub(r'\s+', ' ', query)
-        return query
+        # Lowercase and remove extra whitespace (same rules as document tokenization)
+        return normalize_text(query)
+
+    def encode_query(self, ctx: RetrievalContext) -> np.ndarray:
+        """Encode the normalized query (at most once per context, skipped on embedding-cache hit)"""
+        if ctx.query_emb is None:
+            self.encode_queries([ctx])
+        return ctx.query_emb
 
-    def bm25_search(self, query: str, top_k: int = 8) -> List[Tuple[str, float]]:
+    def encode_queries(self, ctxs: List[RetrievalContext]):
         """
-        Simple BM25-like lexical search
-        Scores based on term overlap
+        Fill `query_emb` for every context: embedding-cache hits are reused and
+        all remaining distinct queries are encoded in a single model call.
         """
-        query_terms = set(self.normalize_query(query).split())
-        scores = []
-
-        for doc_id in self.doc_ids:
-            text = self.documents[doc_id]["text"].lower()
-            doc_terms = set(text.split())
-
-            # Calculate overlap score
-            overlap = len(query_terms & doc_terms)
+        missing: Dict[str, List[RetrievalContext]] = {}
+        for ctx in ctxs:
+            if ctx.query_emb is not None:
+                continue
+            cached = self.embedding_cache.get(ctx.normalized) if self.embedding_cache is not None else None
+            if cached is not None:
+                ctx.query_emb = cached
+            else:
+                missing.setdefault(ctx.normalized, []).append(ctx)
+        if not missing:
+            return
+
+        texts = list(missing)
+        query_embs = self.model.encode(texts, show_progress_bar=False)
+        query_embs = np.ascontiguousarray(query_embs, dtype=np.float32).reshape(len(texts), -1)
 
-            # Normalize by query length
-            score = overlap / max(len(query_terms), 1)
-
-            scores.append((doc_id, score))
-
-        # Sort by score descending
-        scores.sort(key=lambda x: x[1], reverse=True)
-        return scores[:top_k]
+        # Normalize for cosine similarity
+        faiss.normalize_L2(query_embs)
+        for text, query_emb in zip(texts, query_embs):
+            if self.embedding_cache is not None:
+                # Shared across requests, so guard against in-place modification
+                query_emb = query_emb.copy() if len(texts) > 1 else query_emb  # don't pin the whole batch
+                query_emb.flags.writeable = False
+                self.embedding_cache.set(text, query_emb)
+            for ctx in missing[text]:
+                ctx.query_emb = query_emb
+
+    def bm25_search(self, ctx: RetrievalContext, top_k: int = 8) -> List[Tuple[str, float]]:
+        """
+        BM25 lexical search over the inverted index
+        Only the postings of the query terms are scored
+        """
+        return self.pin(ctx).lexical_index.search(ctx.tokens, top_k=top_k, tag_filter=ctx.tag_filter)
 
-    def semantic_search(self, query: str, top_k: int = 8) -> List[Tuple[str, float]]:
+    def semantic_search(self, ctx: RetrievalContext, top_k: int = 8) -> List[Tuple[str, float]]:
         """
         FAISS vector similarity search
         """
-        if self.index is None or self.index.ntotal == 0:
+        index = self.pin(ctx).index
+        if index is None or index.ntotal == 0:
             return []
 
-        # Encode query
-        query_emb = self.model.encode([query], show_progress_bar=False)
-
-        # Normalize for cosine similarity
-        faiss.normalize_L2(query_emb)
-
-        # Search
-        scores, indices = self.index.search(query_emb, min(top_k, self.index.ntotal))
-
-        # Format results
-        results = [
-            (self.doc_ids[idx], float(score))
-            for idx, score in zip(indices[0], scores[0])
-            if idx < len(self.doc_ids)  # Safety check
-        ]
-
-        return results
+        return index.search(self.encode_query(ctx), top_k, params=ctx.search_params, tag_filter=ctx.tag_filter)
 
     def reciprocal_rank_fusion(
             self,
@@ -96,10 +175,26 @@ class HybridRetriever:
 
         return sorted_docs
 
-    def apply_mmr(self, fused_results, query: str, top_k: int = 3, lambda_param: float = 0.7):
+    def collapse_chunks(self, fused_results: List[Tuple[str, float]],
+                        documents: Optional[Dict[str, dict]] = None) -> List[Tuple[str, float]]:
+        """Keep only the best-ranked chunk of each parent document"""
+        documents = self.documents if documents is None else documents
+        seen = set()
+        collapsed = []
+        for key, score in fused_results:
+            parent = documents[key].get("doc_id", key)
+            if parent not in seen:
+                seen.add(parent)
+                collapsed.append((key, score))
+        return collapsed
+
+    def apply_mmr(self, fused_results, ctx: RetrievalContext, top_k: int = 3, lambda_param: float = 0.7,
+                  pool_size: int = MMR_CANDIDATE_POOL):
         """
         Apply Maximal Marginal Relevance (MMR) to diversify results
-        fused_results: list of (doc_id, score) from RRF
+        fused_results: list of (doc_id, score) from RRF; the first `pool_size` are candidates
+        Vectorized: a running max-redundancy vector is updated with one
+        matrix-vector product per selection, so cost is O(top_k * pool * dim).
         """
         # Set a global random seed
         np.random.seed(1211)
@@ -107,95 +202,177 @@ class HybridRetriever:
         if not fused_results:
             return []
 
-        # Encode query embedding
-        query_emb = self.model.encode([query], show_progress_bar=False)
-        faiss.normalize_L2(query_emb)
+        # Reuse the query embedding computed for semantic search
+        query_emb = self.encode_query(ctx)
 
-        # Encode top candidate docs
-        candidate_ids = [doc_id for doc_id, _ in fused_results[:8]]
-        candidate_texts = [self.documents[doc_id]["text"] for doc_id in candidate_ids]
-        doc_embs = self.model.encode(candidate_texts, show_progress_bar=False)
-        faiss.normalize_L2(doc_embs)
+        # Gather stored (already normalized) embeddings of top candidate docs
+        candidate_ids = [doc_id for doc_id, _ in fused_results[:pool_size]]
+        doc_embs = self.pin(ctx).index.get_vectors(candidate_ids)
 
         # Compute similarities
-        sim_query_doc = np.dot(doc_embs, query_emb.T).flatten()
-        sim_doc_doc = np.dot(doc_embs, doc_embs.T)
-
-        selected = []
-        candidates = list(range(len(candidate_ids)))
+        sim_query_doc = doc_embs @ query_emb
+        relevance = lambda_param * sim_query_doc
 
         # Select first doc with highest similarity to query
-        first = np.argmax(sim_query_doc)
-        selected.append(first)
-        candidates.remove(first)
+        first = int(np.argmax(sim_query_doc))
+        selected = [first]
+        available = np.ones(len(candidate_ids), dtype=bool)
+        available[first] = False
+        max_redundancy = doc_embs @ doc_embs[first]
 
         # Select remaining docs with MMR
-        while len(selected) < top_k and candidates:
-            mmr_scores = []
-            for idx in candidates:
-                redundancy = max(sim_doc_doc[idx][selected]) if selected else 0
-                mmr_score = lambda_param * sim_query_doc[idx] - (1 - lambda_param) * redundancy
-                mmr_scores.append(mmr_score)
-
-            # Select best candidate
-            best_idx = candidates[np.argmax(mmr_scores)]
+        while len(selected) < top_k and available.any():
+            mmr_scores = np.where(available, relevance - (1 - lambda_param) * max_redundancy, -np.inf)
+            best_idx = int(np.argmax(mmr_scores))
             selected.append(best_idx)
-            candidates.remove(best_idx)
+            available[best_idx] = False
+            np.maximum(max_redundancy, doc_embs @ doc_embs[best_idx], out=max_redundancy)
 
         # Return selected top-k docs (preserving IDs and scores)
         final_docs = [(candidate_ids[i], float(sim_query_doc[i])) for i in selected]
         return final_docs
 
-    def retrieve(self, query: str, top_k: int = 3) -> List[Dict]:
+    def rank(self, ctx: RetrievalContext, lexical_results: List[Tuple[str, float]],
+             semantic_results: List[Tuple[str, float]], top_k: int = 3) -> List[Dict]:
+        """Fuse, collapse, diversify and format one query's lexical and semantic hits"""
+        documents = self.pin(ctx).documents
+
+        # Fusion
+        start = time.time()
+        fused_results = self.collapse_chunks(self.reciprocal_rank_fusion(lexical_results, semantic_results), documents)
+        ctx.timings['fusion'] = (time.time() - start) * 1000
+
+        # Apply MMR for diversity
+        start = time.time()
+        mmr_results = self.apply_mmr(fused_results, ctx, top_k=top_k, lambda_param=0.7,
+                                     pool_size=self.candidate_pool)
+        ctx.timings['mmr'] = (time.time() - start) * 1000
+
+        # Get top-K documents
+        top_docs = mmr_results[:top_k]
+
+        # Format output
+        results = []
+        for key, score in top_docs:
+            record = documents[key]
+            results.append({
+                "id": record.get("doc_id", key),  # parent document id, used for citations
+                "chunk_id": key,
+                "text": record["text"],
+                "score": round(score, 3),
+                "tags": record.get("tags", [])
+            })
+        return results
+
+    def retrieve(self, query: str, top_k: int = 3, ctx: Optional[RetrievalContext] = None,
+                 include_tags: Optional[List[str]] = None, exclude_tags: Optional[List[str]] = None) -> List[Dict]:
         """
         Main retrieval pipeline:
-        1. Normalize query
-        2. BM25 lexical search (top-8)
-        3. FAISS semantic search (top-8)
-        4. RRF fusion
-        5. Return top-K
+        1. Normalize query (and answer from the semantic cache if a paraphrase was seen)
+        2. BM25 lexical search (top max(8, pool))
+        3. FAISS semantic search (top max(8, pool))
+        4. RRF fusion (best chunk per parent document)
+        5. MMR diversification over the first `candidate_pool` fused chunks
+        6. Return top-K
+        Pass `ctx` to inspect per-stage timings afterwards; the semantic cache is
+        only consulted when `ctx.generation` is set.
+        `include_tags` / `exclude_tags` restrict both searches to documents carrying
+        any include tag and no exclude tag (or pass a prebuilt `ctx.tag_filter`).
         """
-        import time
-
-        # Timing breakdown
-        timings = {}
-
         # Normalize
         start = time.time()
-        normalized_query = self.normalize_query(query)
-        timings['normalize'] = (time.time() - start) * 1000
+        if ctx is None:
+            ctx = RetrievalContext(query=query, top_k=top_k)
+        if self.pin(ctx).index is None:
+            return []  # nothing indexed yet
+        if include_tags or exclude_tags:
+            ctx.tag_filter = TagFilter.build(include_tags, exclude_tags)
+        ctx.normalized = self.normalize_query(query)
+        ctx.tokens = tokenize(ctx.normalized)
+        ctx.timings['normalize'] = (time.time() - start) * 1000
+
+        # Semantic cache: skip lexical search, fusion and MMR for near-duplicate questions
+        use_semantic_cache = self.semantic_cache is not None and ctx.generation is not None
+        if use_semantic_cache:
+            start = time.time()
+            cached = self.semantic_cache.lookup(self.encode_query(ctx), (top_k, ctx.tag_filter), ctx.generation)
+            ctx.timings['semantic_cache'] = (time.time() - start) * 1000
+            if cached is not None:
+                ctx.cache_hit = "semantic"
+                return cached
 
         # Lexical search
         start = time.time()
-        lexical_results = self.bm25_search(normalized_query, top_k=8)
-        timings['lexical'] = (time.time() - start) * 1000
+        lexical_results = self.bm25_search(ctx, top_k=self.search_depth)
+        ctx.timings['lexical'] = (time.time() - start) * 1000
 
         # Semantic search
         start = time.time()
-        semantic_results = self.semantic_search(normalized_query, top_k=8)
-        timings['semantic'] = (time.time() - start) * 1000
+        semantic_results = self.semantic_search(ctx, top_k=self.search_depth)
+        ctx.timings['semantic'] = (time.time() - start) * 1000
 
-        # Fusion
+        results = self.rank(ctx, lexical_results, semantic_results, top_k)
+
+        if use_semantic_cache:
+            self.semantic_cache.add(ctx.query_emb, (top_k, ctx.tag_filter), ctx.generation, results)
+        return results
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 3, include_tags: Optional[List[str]] = None,
+                       exclude_tags: Optional[List[str]] = None,
+                       search_params: Optional[Dict[str, int]] = None) -> Tuple[List[List[Dict]], Dict[str, float]]:
+        """
+        Retrieve for many queries at once: one model call encodes every query not
+        in the embedding cache, one FAISS search runs over the query matrix, then
+        each query is fused and diversified as in `retrieve` (semantic cache not used).
+        Returns per-query results and per-stage timings summed over the batch.
+        """
+        timings: Dict[str, float] = {}
+        tag_filter = TagFilter.build(include_tags, exclude_tags)
+        bundle = self.bundle  # every query in the batch sees the same indexes
+        if bundle.index is None:
+            return [[] for _ in queries], timings
+
+        # Normalize
         start = time.time()
-        fused_results = self.reciprocal_rank_fusion(lexical_results, semantic_results)
-        timings['fusion'] = (time.time() - start) * 1000
+        ctxs = [
+            RetrievalContext(query=query, top_k=top_k, search_params=search_params or {}, tag_filter=tag_filter,
+                             bundle=bundle)
+            for query in queries
+        ]
+        for ctx in ctxs:
+            ctx.normalized = self.normalize_query(ctx.query)
+            ctx.tokens = tokenize(ctx.normalized)
+        timings['normalize'] = (time.time() - start) * 1000
+        if not ctxs:
+            return [], timings
 
-        # Apply MMR for diversity
+        # Encode
         start = time.time()
-        mmr_results = self.apply_mmr(fused_results, normalized_query, top_k=top_k, lambda_param=0.7)
-        timings['mmr'] = (time.time() - start) * 1000
+        self.encode_queries(ctxs)
+        timings['encode'] = (time.time() - start) * 1000
 
-        # Get top-K documents
-        top_docs = mmr_results[:top_k]
+        # Lexical search
+        start = time.time()
+        lexical_results = [self.bm25_search(ctx, top_k=self.search_depth) for ctx in ctxs]
+        timings['lexical'] = (time.time() - start) * 1000
 
-        # Format output
+        # Semantic search: a single FAISS call over the stacked query matrix
+        start = time.time()
+        if bundle.index is None or bundle.index.ntotal == 0:
+            semantic_results = [[] for _ in ctxs]
+        else:
+            semantic_results = bundle.index.search_batch(
+                np.stack([ctx.query_emb for ctx in ctxs]), self.search_depth,
+                params=search_params, tag_filter=tag_filter
+            )
+        timings['semantic'] = (time.time() - start) * 1000
+
+        # Fusion + MMR per query
         results = []
-        for doc_id, score in top_docs:
-            results.append({
-                "id": doc_id,
-                "text": self.documents[doc_id]["text"],
-                "score": round(score, 3),
-                "tags": self.documents[doc_id].get("tags", [])
-            })
+        timings['fusion'] = timings['mmr'] = 0.0
+        for ctx, lexical, semantic in zip(ctxs, lexical_results, semantic_results):
+            results.append(self.rank(ctx, lexical, semantic, top_k))
+            timings['fusion'] += ctx.timings['fusion']
+            timings['mmr'] += ctx.timings['mmr']
 
-        return results
\ No newline at end of file
+        return results, timings
@@ -0,0 +1,148 @@
+import heapq
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend.services.tag_filter import TagBitmaps, TagFilter
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace (shared by queries and documents)"""
+    text = text.lower().strip()
+    return re.sub(r'\s+', ' ', text)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lexical terms, dropping punctuation"""
+    return TOKEN_RE.findall(normalize_text(text))
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring.
+    Postings map term -> {doc_num: term frequency}; document lengths and IDF
+    are precomputed so a query only touches the postings of its own terms.
+    Documents can be added/removed incrementally (IDF is then refreshed lazily).
+    Per-tag bitmaps over doc numbers let a search score only documents passing a tag filter.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_keys: List[Optional[str]] = []
+        self.doc_nums: Dict[str, int] = {}
+        self.doc_lens: List[int] = []
+        self.doc_terms: List[Tuple[str, ...]] = []  # unique terms per doc, for removal
+        self.total_len = 0
+        self.idf: Dict[str, float] = {}
+        self._free_nums: List[int] = []
+        self.tags = TagBitmaps()
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple], **kwargs) -> "BM25Index":
+        """Build an index from (doc_id, text) or (doc_id, text, tags) tuples"""
+        index = cls(**kwargs)
+        for doc_id, text, *tags in items:
+            index._add_postings(doc_id, tokenize(text), tags[0] if tags else ())
+        index.compute_idf()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_nums)
+
+    def _add_postings(self, doc_id: str, terms: List[str], tags: Sequence[str] = ()):
+        if self._free_nums:
+            doc_num = self._free_nums.pop()
+            self.doc_keys[doc_num] = doc_id
+            self.doc_lens[doc_num] = len(terms)
+        else:
+            doc_num = len(self.doc_keys)
+            self.doc_keys.append(doc_id)
+            self.doc_lens.append(len(terms))
+            self.doc_terms.append(())
+        self.doc_nums[doc_id] = doc_num
+        self.total_len += len(terms)
+
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_num] = tf
+        self.doc_terms[doc_num] = tuple(counts)
+        self.tags.add(doc_num, tags)
+
+    def _remove_postings(self, doc_id: str):
+        doc_num = self.doc_nums.pop(doc_id)
+        for term in self.doc_terms[doc_num]:
+            postings = self.postings[term]
+            del postings[doc_num]
+            if not postings:
+                del self.postings[term]
+        self.total_len -= self.doc_lens[doc_num]
+        self.doc_keys[doc_num] = None
+        self.doc_lens[doc_num] = 0
+        self.doc_terms[doc_num] = ()
+        self.tags.clear(doc_num)
+        self._free_nums.append(doc_num)
+
+    def add(self, doc_id: str, text: str, tags: Sequence[str] = ()):
+        """Insert or replace a single document (touches only its own postings)"""
+        if doc_id in self.doc_nums:
+            self._remove_postings(doc_id)
+        self._add_postings(doc_id, tokenize(text), tags)
+        # Corpus size changed, so IDF is recomputed lazily per queried term
+        self.idf.clear()
+
+    def remove(self, doc_id: str):
+        """Remove a document from the index"""
+        if doc_id in self.doc_nums:
+            self._remove_postings(doc_id)
+            self.idf.clear()
+
+    def set_tags(self, doc_id: str, tags: Sequence[str]):
+        """Replace a document's tags without touching its postings"""
+        doc_num = self.doc_nums.get(doc_id)
+        if doc_num is not None:
+            self.tags.clear(doc_num)
+            self.tags.add(doc_num, tags)
+
+    def _term_idf(self, doc_freq: int) -> float:
+        return math.log(1 + (len(self.doc_nums) - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def compute_idf(self):
+        """Precompute IDF for every term in the vocabulary"""
+        self.idf = {term: self._term_idf(len(postings)) for term, postings in self.postings.items()}
+
+    def search(self, terms: List[str], top_k: int = 8,
+               tag_filter: Optional[TagFilter] = None) -> List[Tuple[str, float]]:
+        """Score documents containing any of the query terms, return top-k by BM25"""
+        if not self.doc_nums or top_k <= 0:
+            return []
+
+        # Documents outside the tag filter are skipped while scoring, not dropped from the top-k
+        allowed = None
+        if tag_filter is not None:
+            allowed = self.tags.mask(tag_filter, len(self.doc_keys)).tobytes()  # bytes index fast per posting
+
+        avg_len = self.total_len / len(self.doc_nums) or 1.0
+        k1, b = self.k1, self.b
+        scores: Dict[int, float] = {}
+
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf.get(term)
+            if idf is None:
+                idf = self.idf[term] = self._term_idf(len(postings))
+            for doc_num, tf in postings.items():
+                if allowed is not None and not allowed[doc_num]:
+                    continue
+                norm = k1 * (1 - b + b * self.doc_lens[doc_num] / avg_len)
+                scores[doc_num] = scores.get(doc_num, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])
+        return [(self.doc_keys[doc_num], score) for doc_num, score in top]
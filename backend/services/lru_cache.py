@@ -1,22 +1,158 @@
+import sys
+import threading
+import time
 from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
 
 
-# LRU Cache for queries
+def estimate_size(value: Any) -> int:
+    """Rough in-memory size of a cached value in bytes (numpy arrays, strings, nested containers)"""
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+# LRU Cache for queries (keys are used as-is; callers normalize them)
 class LRUCache:
-    def __init__(self, capacity: int = 30):
-        self.cache = OrderedDict()
+    """
+    Thread-safe LRU cache bounded by entry count and, optionally, by an
+    estimated memory budget. Entries can expire after a TTL (cache-wide
+    default, overridable per entry). `get_or_compute` is single-flight:
+    concurrent misses for the same key run `compute` only once.
+    """
+
+    def __init__(self, capacity: int = 30, ttl: Optional[float] = None, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = estimate_size):
+        self.cache = OrderedDict()  # key -> (value, expires_at, size)
         self.capacity = capacity
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0  # misses that waited on another caller's computation
+        self._inflight = {}  # key -> Future of the computation in progress
+        self._lock = threading.Lock()  # retrieval runs on worker threads
 
-    def get(self, key):
-        key = key.lower().strip()
-        if key in self.cache:
-            self.cache.move_to_end(key)
-            return self.cache[key]
-        return None
-
-    def set(self, key, value):
-        key = key.lower().strip()
-        self.cache[key] = value
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def _lookup(self, key):
+        """Return the live value for `key` or None; caller holds the lock"""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        value, expires_at, size = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.cache[key]
+            self.bytes -= size
+            self.expirations += 1
+            return None
         self.cache.move_to_end(key)
-        if len(self.cache) > self.capacity:
-            self.cache.popitem(last=False)
\ No newline at end of file
+        return value
+
+    def _store(self, key, value, ttl):
+        """Insert and evict down to the bounds; caller holds the lock"""
+        ttl = self.ttl if ttl is None else ttl
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # would evict everything else and still not fit
+
+        old = self.cache.pop(key, None)
+        if old is not None:
+            self.bytes -= old[2]
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self.cache[key] = (value, expires_at, size)
+        self.bytes += size
+
+        while len(self.cache) > self.capacity or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self.cache.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get_or_compute(self, key, compute: Callable[[], Any], ttl: Optional[float] = None):
+        """
+        Return the cached value, or run `compute()` and cache its result.
+        Concurrent callers missing on the same key wait for the first one's
+        result instead of computing it again. Exceptions are not cached.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if value is not None:
+                self._store(key, value, ttl)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self.cache.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.cache),
+                "capacity": self.capacity,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
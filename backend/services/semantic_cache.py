@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Retrieval results keyed by query embedding instead of query text.
+    A lookup returns the results of the most similar earlier query when
+    cosine similarity reaches `threshold`, so paraphrases ("where do patients
+    park", "parking info?") share one retrieval.
+
+    Entries only match within the same scope (top_k, filters) and corpus
+    generation; a new generation drops every entry.
+    """
+
+    def __init__(self, capacity: int = 4096, threshold: float = 0.92, ttl: Optional[float] = None,
+                 neighbors: int = 4):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.neighbors = neighbors  # nearest cached queries checked for a matching scope
+        self.index = None  # faiss.IndexIDMap2 over normalized query embeddings, created on first add
+        self.entries = OrderedDict()  # id -> (scope, results, expires_at), in LRU order
+        self.generation = None
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _reset(self, generation):
+        if self.index is not None:
+            self.index.reset()
+        self.entries.clear()
+        self.generation = generation
+
+    def _remove(self, ids: List[int]):
+        for entry_id in ids:
+            del self.entries[entry_id]
+        self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+    def lookup(self, query_emb: np.ndarray, scope: Hashable, generation: int) -> Optional[list]:
+        """Results of the closest cached query in `scope`, or None if none is similar enough"""
+        with self._lock:
+            if generation != self.generation:
+                self._reset(generation)
+            if not self.entries:
+                self.misses += 1
+                return None
+
+            query = np.ascontiguousarray(query_emb, dtype=np.float32).reshape(1, -1)
+            sims, ids = self.index.search(query, min(self.neighbors, len(self.entries)))
+            now = time.monotonic()
+            expired = []
+            match = None
+            for sim, entry_id in zip(sims[0], ids[0]):
+                if entry_id < 0 or sim < self.threshold:
+                    break
+                entry_scope, results, expires_at = self.entries[entry_id]
+                if expires_at is not None and expires_at <= now:
+                    expired.append(int(entry_id))
+                elif entry_scope == scope:
+                    match = int(entry_id)
+                    break
+            if expired:
+                self._remove(expired)
+
+            if match is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(match)
+            return self.entries[match][1]
+
+    def add(self, query_emb: np.ndarray, scope: Hashable, generation: int, results: list):
+        with self._lock:
+            if generation != self.generation:
+                self._reset(generation)
+            query = np.ascontiguousarray(query_emb, dtype=np.float32).reshape(1, -1)
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(query.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(query, np.array([entry_id], dtype=np.int64))
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self.entries[entry_id] = (scope, results, expires_at)
+
+            overflow = len(self.entries) - self.capacity
+            if overflow > 0:
+                self._remove(list(self.entries)[:overflow])
+                self.evictions += overflow
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional
+
+import numpy as np
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lower()
+
+
+@dataclass(frozen=True)
+class TagFilter:
+    """
+    Tag restriction for a retrieval: a document matches when it carries at
+    least one `include` tag (if any are given) and none of the `exclude` tags.
+    Hashable, so it can be part of cache keys.
+    """
+    include: FrozenSet[str] = frozenset()
+    exclude: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def build(cls, include: Optional[Iterable[str]] = None,
+              exclude: Optional[Iterable[str]] = None) -> Optional["TagFilter"]:
+        """Normalized filter, or None when nothing is restricted"""
+        include = frozenset(normalize_tag(t) for t in include or () if t.strip())
+        exclude = frozenset(normalize_tag(t) for t in exclude or () if t.strip())
+        if not include and not exclude:
+            return None
+        return cls(include, exclude)
+
+    def matches(self, tags: Iterable[str]) -> bool:
+        tags = {normalize_tag(t) for t in tags}
+        return (not self.include or bool(tags & self.include)) and not (tags & self.exclude)
+
+
+class TagBitmaps:
+    """
+    Per-tag membership bitmaps over the integer row numbers of an index
+    (BM25 doc numbers, FAISS slots). Built at ingest and kept in step with
+    upserts, so a filter becomes a few vectorized OR / AND-NOT operations.
+    """
+
+    def __init__(self):
+        self.bitmaps: Dict[str, np.ndarray] = {}  # tag -> bool array indexed by row
+
+    def __len__(self) -> int:
+        return len(self.bitmaps)
+
+    def add(self, row: int, tags: Iterable[str]):
+        """Mark `row` as carrying `tags` (rows are cleared when released)"""
+        for tag in tags:
+            tag = normalize_tag(tag)
+            bitmap = self.bitmaps.get(tag)
+            if bitmap is None or row >= len(bitmap):
+                # Amortized growth, like the embedding matrix
+                grown = np.zeros(max(row + 1, 2 * (0 if bitmap is None else len(bitmap)), 64), dtype=bool)
+                if bitmap is not None:
+                    grown[:len(bitmap)] = bitmap
+                bitmap = self.bitmaps[tag] = grown
+            bitmap[row] = True
+
+    def clear(self, row: int):
+        """Drop every tag of `row`"""
+        for bitmap in self.bitmaps.values():
+            if row < len(bitmap):
+                bitmap[row] = False
+
+    def mask(self, tag_filter: TagFilter, n_rows: int) -> np.ndarray:
+        """Bool mask over rows [0, n_rows) of the rows matching `tag_filter`"""
+        if tag_filter.include:
+            mask = np.zeros(n_rows, dtype=bool)
+            for tag in tag_filter.include:
+                bitmap = self.bitmaps.get(tag)
+                if bitmap is not None:
+                    n = min(n_rows, len(bitmap))
+                    mask[:n] |= bitmap[:n]
+        else:
+            mask = np.ones(n_rows, dtype=bool)
+        for tag in tag_filter.exclude:
+            bitmap = self.bitmaps.get(tag)
+            if bitmap is not None:
+                n = min(n_rows, len(bitmap))
+                mask[:n] &= ~bitmap[:n]
+        return mask
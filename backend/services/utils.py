@@ -1,13 +1,29 @@
 from typing import Tuple, Optional
+import asyncio
+import base64
 import re
+import threading
 import time
-import faiss
 import numpy as np
 import requests
 import backend.variables.global_states as global_state
+from backend.services.lexical_index import BM25Index, normalize_text
+from backend.services.vector_index import VectorIndex
+from backend.services.knowledgeRetriever import RetrievalContext
+from backend.services.tag_filter import TagFilter
+from backend.services.chunker import chunk_text, chunk_id
+from backend.services.index_snapshot import (
+    SnapshotParts, load_snapshot, save_snapshot, read_manifest, snapshot_lock, append_delta, delta_log_size, read_deltas
+)
+from backend.services.concurrency import run_in_retrieval_pool
+from backend.variables.settings import (
+    INDEX_SNAPSHOT_DIR, RETRIEVE_BATCH_CHUNK, SHARED_INDEX, SHARED_INDEX_POLL_S, SHARED_INDEX_CHECKPOINT_MB
+)
 
 OLLAMA_BASE_URL = "http://localhost:11434/api/generate"  # LLM endpoint (commented out)
 OLLAMA_MODEL = "llama3.2:latest"  # LLM model (commented out)
+ENCODE_BATCH_SIZE = 64  # Sentences per forward pass when embedding documents
+_rebuild_start_lock = threading.Lock()
 
 
 ## def detect_intent_llm(message: str, session_id: Optional[str] = None) -> dict:
@@ -206,7 +222,23 @@ def compose_answer(query: str, retrieved_docs: list[dict], use_llm: bool = False
     # else:
     #     return compose_answer_template(query, retrieved_docs)
 
+def chunk_document(doc: dict) -> list[dict]:
+    """Split a document into chunk records that point back to their parent doc"""
+    return [
+        {"id": chunk_id(doc["id"], i), "doc_id": doc["id"], "text": text, "tags": doc.get("tags", [])}
+        for i, text in enumerate(chunk_text(doc["text"]))
+    ]
+
 def rebuild_index():
+    """
+    Full rebuild: chunk, embed and index every document into a fresh set of
+    indexes, then swap them in. Searches keep running on the previous indexes
+    until the swap and never wait on the build; other writers do.
+    """
+    with global_state.writer_lock:
+        _rebuild_index()
+
+def _rebuild_index():
 
     # Set a global random seed
     np.random.seed(1211)
@@ -216,22 +248,447 @@ def rebuild_index():
         return
 
     start = time.time()
-    texts = [d["text"] for d in global_state.documents.values()]
-    global_state.doc_ids = list(global_state.documents.keys())
-    embeddings = global_state.model.encode(texts, show_progress_bar=False)  # Only for retrieval, not LLM
-
-    dimension = embeddings.shape[1]
-    global_state.index = faiss.IndexFlatIP(dimension)
-    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
-    faiss.normalize_L2(embeddings)
-    global_state.index.add(embeddings)
-
-    print(f"✅ FAISS index built in {(time.time() - start) * 1000:.2f}ms")
-
-def get_cached_docs(query: str, top_k: int = 3):
-    cached = global_state.query_cache.get(query)
-    if cached:
-        return cached
-    docs = global_state.retriever.retrieve(query, top_k=top_k)
-    global_state.query_cache.set(query, docs)
-    return docs
+    chunks = {}
+    doc_chunks = {}
+    for doc_id, doc in list(global_state.documents.items()):
+        doc_chunks[doc_id] = []
+        for chunk in chunk_document(doc):
+            chunks[chunk["id"]] = chunk
+            doc_chunks[doc_id].append(chunk["id"])
+
+    if not chunks:
+        print("⚠️ No document text to index")
+        return
+
+    texts = [c["text"] for c in chunks.values()]
+    embeddings = global_state.model.encode(
+        texts,
+        batch_size=ENCODE_BATCH_SIZE,
+        show_progress_bar=False
+    )  # Only for retrieval, not LLM
+
+    # Keep the normalized embedding matrix alongside the FAISS index for reuse (e.g. MMR)
+    # Tag bitmaps are built alongside so tag filters apply inside both searches
+    index = VectorIndex(list(chunks.keys()), embeddings, tags=[c["tags"] for c in chunks.values()])
+
+    # Lexical index is built at ingest so queries only touch their own postings
+    lexical_index = BM25Index.build((cid, c["text"], c["tags"]) for cid, c in chunks.items())
+
+    _install_indexes(index, lexical_index, chunks, doc_chunks)
+    print(f"✅ FAISS index built over {len(chunks)} chunks in {(time.time() - start) * 1000:.2f}ms")
+
+def rebuild_index_in_background() -> bool:
+    """Start a full rebuild on a background thread; False if one is already running"""
+    with _rebuild_start_lock:
+        if global_state.rebuild_thread is not None and global_state.rebuild_thread.is_alive():
+            return False
+        global_state.rebuild_thread = threading.Thread(target=_run_background_rebuild, name="index-rebuild", daemon=True)
+        global_state.rebuild_thread.start()
+    return True
+
+def _run_background_rebuild():
+    try:
+        if SHARED_INDEX and global_state.content_hash is not None:
+            # Catch up, rebuild and publish under one hold of the snapshot lock, so upserts
+            # other workers publish meanwhile wait for the new snapshot instead of being lost
+            with snapshot_lock(INDEX_SNAPSHOT_DIR), global_state.writer_lock:
+                _sync_index_snapshot()
+                _rebuild_index()
+                save_index_snapshot(global_state.content_hash)
+                _remap_vector_index()
+        else:
+            rebuild_index()
+    except Exception as e:
+        print(f"⚠️ Background index rebuild failed: {e}")
+
+def rebuild_vector_index_in_background() -> bool:
+    """
+    Start a FAISS rebuild (switch to the ANN backend, or tombstone compaction) on a
+    background thread once the vector index needs one; False if it does not or a
+    rebuild is already running.
+    """
+    if global_state.index is None or not global_state.index.needs_rebuild():
+        return False
+    with _rebuild_start_lock:
+        for thread in (global_state.rebuild_thread, global_state.vector_rebuild_thread):
+            if thread is not None and thread.is_alive():
+                return False
+        global_state.vector_rebuild_thread = threading.Thread(
+            target=_run_vector_rebuild, name="vector-index-rebuild", daemon=True
+        )
+        global_state.vector_rebuild_thread.start()
+    return True
+
+def _run_vector_rebuild():
+    try:
+        if SHARED_INDEX and global_state.content_hash is not None:
+            # Rebuild the latest published snapshot and republish, so the other workers get it too
+            with snapshot_lock(INDEX_SNAPSHOT_DIR), global_state.writer_lock:
+                _sync_index_snapshot()
+                if _rebuild_vector_index():
+                    save_index_snapshot(global_state.content_hash)
+                    _remap_vector_index()
+        else:
+            with global_state.writer_lock:
+                _rebuild_vector_index()
+    except Exception as e:
+        print(f"⚠️ Vector index rebuild failed: {e}")
+
+def _rebuild_vector_index() -> bool:
+    """
+    Rebuild the FAISS structure from the stored vectors (writer lock held). The
+    build reads them while searches keep running on the old structure; only the
+    swap takes the index write lock.
+    """
+    index = global_state.index
+    if index is None or not index.needs_rebuild():
+        return False
+    start = time.time()
+    kind, dead_ratio = index.kind, index.dead_ratio
+    index.rebuild(global_state.index_lock.write_lock())
+    print(f"✅ Rebuilt vector index ({kind} -> {index.kind}, {dead_ratio:.0%} tombstones) "
+          f"in {(time.time() - start) * 1000:.2f}ms")
+    return True
+
+def _install_indexes(index, lexical_index, chunks, doc_chunks, documents=None):
+    """
+    Publish freshly built indexes to global state and the retriever. The
+    retriever's bundle is replaced with one reference assignment: running
+    searches finish on the old indexes, new ones start on these, and no
+    search ever waits.
+    """
+    with global_state.writer_lock:
+        if documents is not None:
+            global_state.documents = documents
+        global_state.index = index
+        global_state.lexical_index = lexical_index
+        global_state.chunks = chunks
+        global_state.doc_chunks = doc_chunks
+
+        if global_state.retriever is not None:
+            global_state.retriever.update_index(index, lexical_index, chunks)
+        # Bumped after the swap: a search reading the new generation always runs on the new bundle
+        global_state.generation += 1
+
+def save_index_snapshot(content_hash: str):
+    """
+    Persist the current indexes so the next startup can skip re-embedding.
+    Each save bumps the snapshot generation that other workers poll for.
+    `content_hash` identifies the knowledge base the snapshot lineage was built from.
+    """
+    if global_state.index is None:
+        return
+    manifest = read_manifest(INDEX_SNAPSHOT_DIR) or {}
+    generation = max(manifest.get("generation", 0), global_state.snapshot_generation) + 1
+    try:
+        with global_state.index_lock.read_lock():
+            save_snapshot(INDEX_SNAPSHOT_DIR, content_hash, SnapshotParts(
+                global_state.index,
+                global_state.lexical_index,
+                global_state.chunks,
+                global_state.doc_chunks,
+                global_state.documents,
+                generation
+            ))
+    except OSError as e:
+        print(f"⚠️ Could not save index snapshot: {e}")
+        return
+    global_state.snapshot_generation = generation
+    global_state.delta_offset = 0  # the new snapshot directory starts with an empty delta log
+    global_state.content_hash = content_hash
+
+def load_index_snapshot(content_hash: str) -> bool:
+    """Memory-map a matching on-disk snapshot into global state; False if none matches"""
+    parts = load_snapshot(INDEX_SNAPSHOT_DIR, content_hash)
+    if parts is None:
+        return False
+
+    _install_indexes(parts.index, parts.lexical_index, parts.chunks, parts.doc_chunks, parts.documents)
+    global_state.snapshot_generation = parts.generation
+    global_state.delta_offset = 0
+    global_state.content_hash = content_hash
+    return True
+
+def sync_index_snapshot() -> bool:
+    """
+    Shared-index mode: map the snapshot another worker published if it is newer
+    than ours, then replay the upserts appended to its delta log since. Unchanged
+    pages stay shared through the page cache, so every worker serves the same
+    corpus without holding a private copy. Runs under the shared snapshot lock,
+    so a publish can't replace files mid-read.
+    """
+    manifest = read_manifest(INDEX_SNAPSHOT_DIR)
+    if manifest is None or (manifest.get("generation", 0) <= global_state.snapshot_generation
+                            and delta_log_size(INDEX_SNAPSHOT_DIR) <= global_state.delta_offset):
+        return False  # cheap unlocked check for the common no-change poll
+    with snapshot_lock(INDEX_SNAPSHOT_DIR, shared=True):
+        return _sync_index_snapshot()
+
+def _sync_index_snapshot() -> bool:
+    """`sync_index_snapshot` for callers already holding the snapshot lock"""
+    with global_state.writer_lock:
+        manifest = read_manifest(INDEX_SNAPSHOT_DIR)
+        if manifest is None:
+            return False
+        reloaded = manifest.get("generation", 0) > global_state.snapshot_generation
+        if reloaded and not load_index_snapshot(manifest["content_hash"]):
+            return False
+        replayed = _replay_deltas()
+    if reloaded:
+        print(f"✅ Reloaded shared index snapshot (generation {global_state.snapshot_generation})")
+    if replayed:
+        print(f"✅ Replayed {replayed} shared index updates")
+    return reloaded or replayed > 0
+
+def _replay_deltas() -> int:
+    """Apply delta log records we haven't applied yet (snapshot lock and writer lock held)"""
+    records, offset = read_deltas(INDEX_SNAPSHOT_DIR, global_state.delta_offset)
+    for record in records:
+        embeddings = None
+        if record.get("embeddings"):
+            embeddings = np.frombuffer(base64.b64decode(record["embeddings"]), dtype=np.float32)
+            embeddings = embeddings.reshape(-1, record["dimension"]).copy()
+        _apply_upserts(record["docs"], embeddings)
+    global_state.delta_offset = offset
+    return len(records)
+
+def _delta_record(docs: list[dict], embeddings: Optional[np.ndarray]) -> dict:
+    """Delta log record of an applied upsert batch; carries its chunk embeddings so replays skip the model"""
+    record = {"docs": docs, "embeddings": None}
+    if embeddings is not None:
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        record["embeddings"] = base64.b64encode(embeddings.tobytes()).decode("ascii")
+        record["dimension"] = embeddings.shape[1]
+    return record
+
+def load_or_build_index(content_hash: str):
+    """
+    Startup: under the cross-process snapshot lock, map a snapshot of this knowledge
+    base (including upserts published since) or build and publish one. With several
+    workers only the first builds; the rest wait and map the result.
+    """
+    with snapshot_lock(INDEX_SNAPSHOT_DIR), global_state.writer_lock:
+        if load_index_snapshot(content_hash):
+            _replay_deltas()
+        else:
+            rebuild_index()
+            save_index_snapshot(content_hash)
+            if SHARED_INDEX and global_state.index is not None:
+                # Serve from the shared mapping like the other workers, not a private copy
+                _remap_vector_index()
+            # Empty knowledge base: nothing saved, but later upserts publish under this lineage
+            global_state.content_hash = content_hash
+
+async def watch_index_snapshot(interval: float = SHARED_INDEX_POLL_S):
+    """Background task: reload whenever another worker publishes a newer snapshot generation"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(sync_index_snapshot)
+        except Exception as e:
+            print(f"⚠️ Shared index reload failed: {e}")
+
+def upsert_documents(docs: list[dict]) -> dict:
+    """
+    Incrementally (re)index a batch of documents ({id, text, tags}).
+    In shared-index mode the update is applied on top of the latest published
+    state and appended to the snapshot's delta log under the cross-process lock,
+    so no worker's upserts are lost and the others replay them on their next
+    poll. Publishing costs O(batch); the snapshot itself is only rewritten once
+    the log passes SHARED_INDEX_CHECKPOINT_MB.
+    """
+    if not SHARED_INDEX:
+        with global_state.writer_lock:
+            stats, _ = _apply_upserts(docs)
+    else:
+        with snapshot_lock(INDEX_SNAPSHOT_DIR), global_state.writer_lock:
+            _sync_index_snapshot()
+            stats, embeddings = _apply_upserts(docs)
+            publish_start = time.time()
+            if (read_manifest(INDEX_SNAPSHOT_DIR) is not None
+                    and delta_log_size(INDEX_SNAPSHOT_DIR) < SHARED_INDEX_CHECKPOINT_MB * 2 ** 20):
+                global_state.delta_offset = append_delta(INDEX_SNAPSHOT_DIR, _delta_record(docs, embeddings))
+            else:
+                # Checkpoint: fold the log into a fresh snapshot and map it again
+                save_index_snapshot(global_state.content_hash)
+                _remap_vector_index()
+            stats["publish_ms"] = round((time.time() - publish_start) * 1000, 2)
+            stats["total_ms"] = round(stats["total_ms"] + stats["publish_ms"], 2)
+    rebuild_vector_index_in_background()
+    return stats
+
+def _remap_vector_index():
+    """Swap our privately modified vectors for a mapping of the snapshot just published"""
+    try:
+        index = VectorIndex.load(INDEX_SNAPSHOT_DIR)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"⚠️ Could not map published index snapshot: {e}")
+        return
+    global_state.index = index
+    if global_state.retriever is not None:
+        global_state.retriever.update_index(index, global_state.lexical_index)
+
+def _apply_upserts(docs: list[dict], embeddings: Optional[np.ndarray] = None) -> Tuple[dict, Optional[np.ndarray]]:
+    """
+    Apply a batch of document upserts to this process's indexes (writer lock held).
+    Changed texts are re-chunked and the new chunks encoded in one batched model
+    call outside the index lock; the documents' old chunk vectors and postings
+    are then replaced in a single short index update. `embeddings` (new chunks,
+    in order) skips the encode when replaying a delta. Returns the stats and the
+    new chunks' embeddings.
+    """
+    start = time.time()
+    latest = {doc["id"]: doc for doc in docs}  # last write wins within a batch
+
+    if global_state.index is None or global_state.lexical_index is None:
+        # Nothing indexed yet (e.g. empty knowledge base at startup)
+        global_state.documents.update(latest)
+        _rebuild_index()
+        total_ms = round((time.time() - start) * 1000, 2)
+        return {
+            "docs": len(docs),
+            "chunks": len(global_state.chunks),
+            "encode_ms": total_ms,
+            "index_ms": 0.0,
+            "total_ms": total_ms
+        }, None
+
+    changed = {}
+    for doc_id, doc in latest.items():
+        previous = global_state.documents.get(doc_id)
+        if previous is None or previous["text"] != doc["text"]:
+            changed[doc_id] = doc
+
+    new_chunks = {}
+    new_doc_chunks = {}
+    for doc_id, doc in changed.items():
+        chunks = chunk_document(doc)
+        new_doc_chunks[doc_id] = [c["id"] for c in chunks]
+        new_chunks.update((c["id"], c) for c in chunks)
+
+    encode_start = time.time()
+    if not new_chunks:
+        embeddings = None
+    elif embeddings is None or len(embeddings) != len(new_chunks):
+        embeddings = global_state.model.encode(
+            [c["text"] for c in new_chunks.values()],
+            batch_size=ENCODE_BATCH_SIZE,
+            show_progress_bar=False
+        )
+    encode_ms = (time.time() - encode_start) * 1000
+
+    stale = [
+        cid for doc_id in changed
+        for cid in global_state.doc_chunks.get(doc_id, [])
+        if cid not in new_chunks
+    ]
+
+    index_start = time.time()
+    with global_state.index_lock.write_lock():
+        # Vectors first: the only step that can fail (bad embeddings, FAISS errors) runs
+        # before documents, chunks or postings change, so a failed upsert changes nothing
+        if new_chunks:
+            global_state.index.upsert(list(new_chunks.keys()), embeddings, [c["tags"] for c in new_chunks.values()])
+        if stale:
+            global_state.index.remove(stale)
+
+        for cid, chunk in new_chunks.items():
+            global_state.lexical_index.add(cid, chunk["text"], chunk["tags"])
+        for cid in stale:
+            global_state.lexical_index.remove(cid)
+            global_state.chunks.pop(cid, None)
+        global_state.chunks.update(new_chunks)
+
+        for doc_id, doc in latest.items():
+            global_state.documents[doc_id] = doc
+            if doc_id not in changed:
+                # Metadata-only change: embeddings and postings are still valid
+                for cid in global_state.doc_chunks.get(doc_id, []):
+                    global_state.chunks[cid]["tags"] = doc.get("tags", [])
+                    global_state.index.set_tags(cid, doc.get("tags", []))
+                    global_state.lexical_index.set_tags(cid, doc.get("tags", []))
+        global_state.doc_chunks.update(new_doc_chunks)
+        global_state.generation += 1  # invalidates cached results of earlier generations
+    index_ms = (time.time() - index_start) * 1000
+
+    return {
+        "docs": len(docs),
+        "chunks": len(new_chunks),
+        "encode_ms": round(encode_ms, 2),
+        "index_ms": round(index_ms, 2),
+        "total_ms": round((time.time() - start) * 1000, 2)
+    }, embeddings
+
+def upsert_document(doc_id: str, text: str, tags: list[str]):
+    """
+    Incrementally (re)index a single document.
+    Only this document's text is encoded; its old vector and postings are replaced.
+    """
+    return upsert_documents([{"id": doc_id, "text": text, "tags": tags}])
+
+def get_cached_docs(query: str, top_k: int = 3, search_params: Optional[dict] = None,
+                    include_tags: Optional[list[str]] = None, exclude_tags: Optional[list[str]] = None):
+    tag_filter = TagFilter.build(include_tags, exclude_tags)
+    if search_params:
+        # Explicit ANN tuning knobs (ef_search / nprobe) bypass the result cache
+        ctx = RetrievalContext(query=query, top_k=top_k, search_params=search_params, tag_filter=tag_filter)
+        with global_state.index_lock.read_lock():
+            return global_state.retriever.retrieve(query, top_k=top_k, ctx=ctx)
+
+    def compute():
+        with global_state.index_lock.read_lock():
+            ctx = RetrievalContext(query=query, top_k=top_k, tag_filter=tag_filter, generation=global_state.generation)
+            return global_state.retriever.retrieve(query, top_k=top_k, ctx=ctx)
+
+    # Results are only valid for the corpus generation they were computed on. The generation
+    # is read before searching, so an entry may hold newer results than its key, never older.
+    # Concurrent misses on the same key share a single retrieval.
+    key = (normalize_text(query), top_k, tag_filter, global_state.generation)
+    return global_state.query_cache.get_or_compute(key, compute)
+
+async def get_cached_docs_async(query: str, top_k: int = 3, search_params: Optional[dict] = None,
+                                include_tags: Optional[list[str]] = None, exclude_tags: Optional[list[str]] = None):
+    """Async facade: run retrieval on the bounded retrieval pool, off the event loop"""
+    return await run_in_retrieval_pool(get_cached_docs, query, top_k, search_params, include_tags, exclude_tags)
+
+def retrieve_batch(queries: list[str], top_k: int = 3, include_tags: Optional[list[str]] = None,
+                   exclude_tags: Optional[list[str]] = None, search_params: Optional[dict] = None) -> Tuple[list, dict]:
+    """
+    Retrieve for many queries (offline evaluation, cache pre-warming).
+    Result-cache hits are reused; misses are retrieved in slices of RETRIEVE_BATCH_CHUNK
+    (one encode + one FAISS search each, read lock held per slice so writers are not
+    starved) and stored in the result cache. Returns results and per-stage timings.
+    """
+    tag_filter = TagFilter.build(include_tags, exclude_tags)
+    normalized = [normalize_text(query) for query in queries]
+    results = [None] * len(queries)
+
+    pending = list(range(len(queries)))
+    if not search_params:
+        generation = global_state.generation
+        pending = []
+        for i, text in enumerate(normalized):
+            results[i] = global_state.query_cache.get((text, top_k, tag_filter, generation))
+            if results[i] is None:
+                pending.append(i)
+
+    timings = {}
+    for start in range(0, len(pending), RETRIEVE_BATCH_CHUNK):
+        batch = pending[start:start + RETRIEVE_BATCH_CHUNK]
+        with global_state.index_lock.read_lock():
+            generation = global_state.generation
+            docs, stage_timings = global_state.retriever.retrieve_batch(
+                [queries[i] for i in batch], top_k, include_tags, exclude_tags, search_params
+            )
+        for i, query_docs in zip(batch, docs):
+            results[i] = query_docs
+            if not search_params:
+                global_state.query_cache.set((normalized[i], top_k, tag_filter, generation), query_docs)
+        for stage, ms in stage_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + ms
+
+    return results, {
+        "cache_hits": len(queries) - len(pending),
+        "retrieved": len(pending),
+        "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()}
+    }
@@ -0,0 +1,625 @@
+import json
+import math
+import os
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import faiss
+
+from backend.services.tag_filter import TagBitmaps, TagFilter
+
+from backend.variables.settings import (
+    INDEX_BACKEND, ANN_MIN_VECTORS, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH,
+    IVF_NLIST, IVF_NPROBE, IVF_TRAIN_SAMPLE, PQ_M, PQ_NBITS, TOMBSTONE_COMPACT_RATIO, INDEX_OVERLAY_MAX,
+    VECTOR_PRECISION, RESCORE_EXACT, RESCORE_OVERSAMPLE
+)
+
+INDEX_BACKENDS = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+PRECISIONS = ("float32", "float16", "int8")
+FILTER_EXACT_MAX = 4096  # tag filters matching at most this many slots are searched exactly
+INT8_SCALE = 127.0  # int8 code of a dimension's largest magnitude
+SQ_MIN_TRAIN = 1000  # smaller int8 training sets are padded with the [-1, 1] bounds
+COMPACT_MIN_DEAD = 64  # never compact for fewer tombstones than this
+
+_STORE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+def _sq_type(precision: str):
+    return {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}[precision]
+
+
+def make_faiss_index(backend: str, dimension: int, n_vectors: int, precision: str = "float32"):
+    """
+    Index factory: create an (untrained) inner-product FAISS index for `backend`.
+    `precision` float16 / int8 stores vectors as scalar-quantized codes (IVF-PQ is
+    already compressed and ignores it). IVF and int8 indexes must be trained
+    before vectors are added.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown vector precision '{precision}', expected one of {PRECISIONS}")
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if backend == "flat":
+        if precision == "float32":
+            return faiss.IndexFlatIP(dimension)
+        return faiss.IndexScalarQuantizer(dimension, _sq_type(precision), metric)
+
+    if backend == "hnsw":
+        if precision == "float32":
+            index = faiss.IndexHNSWFlat(dimension, HNSW_M, metric)
+        else:
+            index = faiss.IndexHNSWSQ(dimension, _sq_type(precision), HNSW_M, metric)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    if backend in ("ivf_flat", "ivf_pq"):
+        nlist = IVF_NLIST or max(1, int(4 * math.sqrt(n_vectors)))
+        quantizer = faiss.IndexFlatIP(dimension)
+        if backend == "ivf_flat" and precision == "float32":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+        elif backend == "ivf_flat":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, _sq_type(precision), metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = IVF_NPROBE
+        return index
+
+    raise ValueError(f"Unknown index backend '{backend}', expected one of {INDEX_BACKENDS}")
+
+
+class VectorIndex:
+    """
+    ID-mapped FAISS inner-product index plus the normalized embedding matrix it was built from.
+    Each document owns a stable integer slot: the FAISS id, the row of `embeddings`
+    and the position in `doc_ids` are all the same number, so callers can gather
+    document vectors by row lookup and upserts only touch the changed documents.
+
+    The FAISS structure comes from `make_faiss_index`. Until the corpus reaches
+    ANN_MIN_VECTORS an exact flat index is used; once it crosses the threshold,
+    `rebuild` trains the configured backend from the stored matrix (no re-encoding)
+    while the flat index keeps serving and taking upserts. Replaced and
+    removed vectors are tombstoned and excluded at search rather than removed from
+    FAISS (an O(n) shift of the codes): the flat index reuses a tombstoned slot by
+    overwriting its codes in place, and `rebuild` drops the rest once they pass
+    TOMBSTONE_COMPACT_RATIO.
+    Per-tag bitmaps over slots restrict a search to tagged documents inside FAISS
+    (ID selector), or by exact scoring when only a few slots match.
+
+    Loaded with mmap, the FAISS codes and the matrix stay read-only mappings of the
+    snapshot, shared by every process that maps it. Upserts then go to an in-memory
+    overlay (an exact flat index over new slots, plus their matrix rows) that
+    searches merge with the mapped base; `save` folds it in, as does `rebuild`
+    once it passes INDEX_OVERLAY_MAX.
+
+    With `precision` float16 / int8 both the FAISS codes and the stored matrix use
+    reduced precision (2x / 4x smaller). `rescore` re-ranks an oversampled FAISS
+    candidate list against the stored matrix, undoing most of the quantization
+    (or PQ) ranking error.
+    """
+
+    def __init__(self, doc_ids: List[str], embeddings: np.ndarray, backend: str = INDEX_BACKEND,
+                 tags: Optional[Sequence[Sequence[str]]] = None, precision: str = VECTOR_PRECISION,
+                 rescore: bool = RESCORE_EXACT):
+        if backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unknown index backend '{backend}', expected one of {INDEX_BACKENDS}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown vector precision '{precision}', expected one of {PRECISIONS}")
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.backend = backend  # configured backend
+        self.precision = precision
+        self.rescore = rescore
+        self.kind = "flat"  # backend currently in use
+        self.doc_ids: List[Optional[str]] = []  # slot -> doc_id (None for freed slots)
+        self.rows = {}  # doc_id -> slot
+        self._free_slots: List[int] = []
+        self._dead = set()  # tombstoned slots still present in the FAISS index
+        self._dead_selector = None
+        self._positions = None  # flat kind: slot -> row of the FAISS codes (-1 if not added)
+        self._mapped = False  # FAISS codes and matrix are read-only mappings of a snapshot
+        self._overlay = None  # mapped: in-memory flat index over slots written since loading
+        self._tail = None  # mapped: in-memory matrix rows of slots past the mapped matrix
+        self._matrix = np.zeros((max(len(doc_ids), 16), embeddings.shape[1]), dtype=_STORE_DTYPES[precision])
+        self.tags = TagBitmaps()
+
+        doc_ids, embeddings, tags = self._dedupe(list(doc_ids), embeddings, tags)
+        faiss.normalize_L2(embeddings)
+        # int8: per-dimension scale fitted to the initial corpus, never tighter than 4 standard
+        # deviations of a random unit vector so small seed corpora don't clip later upserts
+        max_abs = np.abs(embeddings).max(axis=0) if len(embeddings) else 0.0
+        max_abs = np.maximum(max_abs, 4 / math.sqrt(self.dimension))
+        self._int8_scale = (INT8_SCALE / max_abs).astype(np.float32)
+        for i, (doc_id, vector) in enumerate(zip(doc_ids, self._encode_rows(embeddings))):
+            slot = self._allocate_slot(doc_id)
+            self._matrix[slot] = vector
+            if tags is not None:
+                self.tags.add(slot, tags[i])
+        self.rebuild()
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal + (self._overlay.ntotal if self._overlay is not None else 0)
+
+    @property
+    def dimension(self) -> int:
+        return self._matrix.shape[1]
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Stored embedding matrix aligned with doc_ids, in storage precision (rows of freed slots are unused)"""
+        if self._tail is None:
+            return self._matrix[:len(self.doc_ids)]
+        return np.concatenate([self._matrix, self._tail[:len(self.doc_ids) - len(self._matrix)]])
+
+    def _gather(self, slots) -> np.ndarray:
+        """Stored rows of `slots`, from the matrix or (mapped) the in-memory tail"""
+        slots = np.asarray(slots, dtype=np.int64)
+        tail = slots >= len(self._matrix)
+        if self._tail is None or not tail.any():
+            return self._matrix[slots]
+        rows = np.empty((len(slots), self.dimension), dtype=self._matrix.dtype)
+        rows[~tail] = self._matrix[slots[~tail]]
+        rows[tail] = self._tail[slots[tail] - len(self._matrix)]
+        return rows
+
+    def _store(self, slots: np.ndarray, rows: np.ndarray):
+        if self._mapped:
+            # Slots allocated on a mapped index always lie past the read-only matrix
+            self._tail[slots - len(self._matrix)] = rows
+        else:
+            self._matrix[slots] = rows
+
+    @staticmethod
+    def _grow(rows: np.ndarray) -> np.ndarray:
+        """Amortized growth so single-document upserts stay O(1) on average"""
+        grown = np.zeros((max(len(rows) * 2, 16), rows.shape[1]), dtype=rows.dtype)
+        grown[:len(rows)] = rows
+        return grown
+
+    def _encode_rows(self, vectors: np.ndarray) -> np.ndarray:
+        """Normalized float32 vectors -> storage precision"""
+        if self.precision == "int8":
+            return np.clip(np.rint(vectors * self._int8_scale), -INT8_SCALE, INT8_SCALE).astype(np.int8)
+        return vectors.astype(_STORE_DTYPES[self.precision], copy=False)
+
+    def _decode_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Stored rows -> float32 for scoring"""
+        if self.precision == "int8":
+            return rows.astype(np.float32) / self._int8_scale
+        return rows.astype(np.float32, copy=False)
+
+    @staticmethod
+    def _dedupe(doc_ids: List[str], embeddings: np.ndarray, tags=None):
+        if len(set(doc_ids)) != len(doc_ids):
+            # Last write wins for ids repeated within one batch
+            last = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+            keep = sorted(last.values())
+            doc_ids = [doc_ids[i] for i in keep]
+            embeddings = np.ascontiguousarray(embeddings[keep])
+            if tags is not None:
+                tags = [tags[i] for i in keep]
+        return doc_ids, embeddings, tags
+
+    def _make_faiss(self):
+        """Build a FAISS structure over the live slots without touching this index; returns (index, kind)"""
+        slots = np.array(sorted(self.rows.values()), dtype=np.int64)
+        kind = self.backend if len(slots) >= ANN_MIN_VECTORS else "flat"
+
+        inner = make_faiss_index(kind, self.dimension, len(slots), self.precision)
+        vectors = self._decode_rows(self._gather(slots))
+        if not inner.is_trained:
+            sample = vectors
+            if len(sample) > IVF_TRAIN_SAMPLE:
+                rng = np.random.default_rng(1211)
+                sample = sample[rng.choice(len(sample), IVF_TRAIN_SAMPLE, replace=False)]
+            if self.precision == "int8" and len(sample) < SQ_MIN_TRAIN:
+                # Too few vectors to learn per-dimension ranges: pad with the unit bounds
+                bounds = np.eye(self.dimension, dtype=np.float32)
+                sample = np.vstack([sample, bounds, -bounds])
+            inner.train(sample)
+
+        # IVF indexes store ids natively (and remove by id); the ID map's removal
+        # assumes a compacting inner index, which only holds for flat / HNSW
+        index = inner if kind in ("ivf_flat", "ivf_pq") else faiss.IndexIDMap2(inner)
+        if len(slots):
+            index.add_with_ids(vectors, slots)
+        return index, kind
+
+    def _install_faiss(self, index, kind):
+        """Swap in a structure from `_make_faiss`: tombstoned slots become free for reuse"""
+        if self._mapped:
+            # The new structure holds the overlay too; the matrix moves into memory along with it
+            self._matrix = self.embeddings.copy()
+            self._tail = None
+        self.index = index
+        self.kind = kind
+        self._mapped = False
+        self._overlay = None
+        self._free_slots.extend(self._dead)
+        self._dead = set()
+        self._dead_selector = None
+        self._map_positions()
+
+    def _map_positions(self):
+        """Flat kind: record which row of the FAISS codes holds each slot, for in-place overwrites"""
+        self._positions = None
+        if self.kind == "flat":
+            self._positions = np.full(len(self._matrix), -1, dtype=np.int64)
+            self._positions[faiss.vector_to_array(self.index.id_map)] = np.arange(self.index.ntotal)
+
+    def _allocate_slot(self, doc_id: str) -> int:
+        if self.kind == "flat" and self._dead and not self._mapped:
+            # Flat codes can be overwritten in place: reuse a tombstoned slot along with its FAISS row
+            slot = self._dead.pop()
+            self._dead_selector = None
+            self.doc_ids[slot] = doc_id
+        elif self._free_slots and not self._mapped:
+            slot = self._free_slots.pop()
+            self.doc_ids[slot] = doc_id
+        else:
+            slot = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            if self._mapped:
+                # The mapped matrix is read-only: rows of new slots go to the in-memory tail
+                if slot - len(self._matrix) >= len(self._tail):
+                    self._tail = self._grow(self._tail)
+            elif slot >= len(self._matrix):
+                self._matrix = self._grow(self._matrix)
+                if self._positions is not None:
+                    self._positions = np.concatenate(
+                        [self._positions, np.full(len(self._matrix) - len(self._positions), -1, dtype=np.int64)]
+                    )
+        self.rows[doc_id] = slot
+        return slot
+
+    def _release_slots(self, slots: List[int]):
+        """Tombstone vectors (searches skip them until reuse or compaction) and clear their rows"""
+        if not slots:
+            return
+        self._dead.update(slots)
+        self._dead_selector = None
+        for slot in slots:
+            self.doc_ids[slot] = None
+            if not self._mapped:
+                self._matrix[slot] = 0
+            self.tags.clear(slot)
+
+    def upsert(self, doc_ids: List[str], embeddings: np.ndarray, tags: Optional[Sequence[Sequence[str]]] = None):
+        """Insert or replace vectors (and tags) for the given doc ids (only these are touched)"""
+        if len(doc_ids) == 0:
+            return
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.shape != (len(doc_ids), self.dimension):
+            # Checked before any slot is touched, so a bad batch leaves the index unchanged
+            raise ValueError(f"Expected {len(doc_ids)} embeddings of dimension {self.dimension}, got {embeddings.shape}")
+        doc_ids, embeddings, tags = self._dedupe(list(doc_ids), embeddings, tags)
+        faiss.normalize_L2(embeddings)
+
+        # Drop stale vectors of documents being replaced
+        self._release_slots([self.rows.pop(doc_id) for doc_id in doc_ids if doc_id in self.rows])
+
+        slots = np.array([self._allocate_slot(doc_id) for doc_id in doc_ids], dtype=np.int64)
+        self._store(slots, self._encode_rows(embeddings))
+        if tags is not None:
+            for slot, doc_tags in zip(slots, tags):
+                self.tags.add(int(slot), doc_tags)
+
+        if self._mapped:
+            # The mapped codes are read-only (and shared): new vectors go to the overlay
+            if self._overlay is None:
+                self._overlay = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+            self._overlay.add_with_ids(embeddings, slots)
+        # Past ANN_MIN_VECTORS the flat index keeps growing until a `rebuild` switches backends
+        elif self.kind == "flat":
+            self._write_flat(slots, embeddings)
+        else:
+            self.index.add_with_ids(embeddings, slots)
+
+    def _write_flat(self, slots: np.ndarray, vectors: np.ndarray):
+        """Overwrite the codes of slots already in the flat index in place, append the others"""
+        positions = self._positions[slots]
+        placed = positions >= 0
+        if placed.any():
+            inner = faiss.downcast_index(self.index.index)
+            codes = faiss.rev_swig_ptr(inner.codes.data(), inner.codes.size()).reshape(-1, inner.code_size)
+            codes[positions[placed]] = inner.sa_encode(vectors[placed])
+        if not placed.all():
+            added = slots[~placed]
+            self._positions[added] = np.arange(self.index.ntotal, self.index.ntotal + len(added))
+            self.index.add_with_ids(vectors[~placed], added)
+
+    def remove(self, doc_ids: List[str]):
+        """Remove documents from the index and free their slots"""
+        self._release_slots([self.rows.pop(doc_id) for doc_id in doc_ids if doc_id in self.rows])
+
+    def set_tags(self, doc_id: str, tags: Sequence[str]):
+        """Replace a document's tags without touching its vector"""
+        slot = self.rows.get(doc_id)
+        if slot is not None:
+            self.tags.clear(slot)
+            self.tags.add(slot, tags)
+
+    def rebuild(self, swap_lock=None):
+        """
+        Rebuild the FAISS structure from the stored vectors: retrain for the current
+        corpus size, drop tombstones and fold in the overlay (moving a mapped index
+        into memory). The build only reads this index, so searches
+        keep running on the old structure; just the swap happens under `swap_lock`
+        (the index write lock). Writers must stay out until it returns.
+        """
+        built = self._make_faiss()
+        with swap_lock or nullcontext():
+            self._install_faiss(*built)
+
+    @property
+    def dead_ratio(self) -> float:
+        """Fraction of the FAISS index taken by tombstoned vectors"""
+        return len(self._dead) / self.ntotal if self.ntotal else 0.0
+
+    def needs_rebuild(self) -> bool:
+        """
+        A `rebuild` is due: the corpus reached ANN_MIN_VECTORS on the flat index,
+        the overlay reached INDEX_OVERLAY_MAX, or tombstones passed TOMBSTONE_COMPACT_RATIO
+        """
+        if self.kind == "flat" and self.backend != "flat" and len(self.rows) >= ANN_MIN_VECTORS:
+            return True
+        if self._overlay is not None and self._overlay.ntotal >= INDEX_OVERLAY_MAX:
+            return True
+        return len(self._dead) >= COMPACT_MIN_DEAD and self.dead_ratio >= TOMBSTONE_COMPACT_RATIO
+
+    def _search_params(self, top_k: int, params: Optional[Dict] = None, selector=None):
+        """
+        Per-request FAISS search parameters (ef_search / nprobe), plus tombstone exclusion.
+        An explicit `selector` (tag filter, tombstones already folded in) replaces the tombstone one.
+        """
+        params = params or {}
+        if self.kind == "hnsw":
+            search_params = faiss.SearchParametersHNSW()
+            search_params.efSearch = max(int(params.get("ef_search") or HNSW_EF_SEARCH), top_k)
+        elif self.kind in ("ivf_flat", "ivf_pq"):
+            search_params = faiss.SearchParametersIVF()
+            search_params.nprobe = int(params.get("nprobe") or IVF_NPROBE)
+        elif self._dead or selector is not None:
+            search_params = faiss.SearchParameters()
+        else:
+            return None
+
+        if selector is not None:
+            search_params.sel = selector
+        elif self._dead:
+            search_params.sel = self._tombstone_selector()
+        return search_params
+
+    def _tombstone_selector(self):
+        """ID selector skipping tombstoned slots (None without tombstones)"""
+        if not self._dead:
+            return None
+        if self._dead_selector is None:
+            batch = faiss.IDSelectorBatch(np.array(sorted(self._dead), dtype=np.int64))
+            # Keep both objects alive: the Not selector only holds a pointer
+            self._dead_selector = (batch, faiss.IDSelectorNot(batch))
+        return self._dead_selector[1]
+
+    def _merge_overlay(self, query_embs: np.ndarray, scores: np.ndarray, indices: np.ndarray, k: int, selector=None):
+        """Merge the overlay's top-k into FAISS results from the mapped base (same selector)"""
+        search_params = None
+        selector = selector if selector is not None else self._tombstone_selector()
+        if selector is not None:
+            search_params = faiss.SearchParameters()
+            search_params.sel = selector
+        more_scores, more_indices = self._overlay.search(query_embs, min(k, self._overlay.ntotal), params=search_params)
+        scores = np.hstack([scores, more_scores])
+        indices = np.hstack([indices, more_indices])
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _filtered_slots(self, tag_filter: TagFilter) -> np.ndarray:
+        """Bool mask over slots that are live and pass `tag_filter`"""
+        mask = self.tags.mask(tag_filter, len(self.doc_ids))
+        mask[np.array(self._free_slots, dtype=np.int64)] = False
+        if self._dead:
+            mask[np.fromiter(self._dead, dtype=np.int64)] = False
+        return mask
+
+    def _search_exact(self, query_embs: np.ndarray, slots: np.ndarray, k: int) -> List[List[Tuple[str, float]]]:
+        """Exact inner-product top-k restricted to `slots`"""
+        scores = query_embs @ self._decode_rows(self._gather(slots)).T
+        k = min(k, len(slots))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_top, row_scores in zip(top, scores):
+            row_top = row_top[np.argsort(-row_scores[row_top], kind="stable")]
+            results.append([(self.doc_ids[slots[i]], float(row_scores[i])) for i in row_top])
+        return results
+
+    def search_batch(self, query_embs: np.ndarray, top_k: int = 8, params: Optional[Dict] = None,
+                     tag_filter: Optional[TagFilter] = None) -> List[List[Tuple[str, float]]]:
+        """Search with a matrix of normalized query vectors, one result list per row"""
+        query_embs = np.ascontiguousarray(query_embs, dtype=np.float32).reshape(-1, self.dimension)
+        if self.ntotal == 0 or top_k <= 0:
+            return [[] for _ in range(len(query_embs))]
+
+        k = min(top_k, self.ntotal)
+        selector = None
+        if tag_filter is not None:
+            mask = self._filtered_slots(tag_filter)
+            slots = np.flatnonzero(mask)
+            if len(slots) <= FILTER_EXACT_MAX:
+                # Selective filter: scoring the few matching rows beats any index traversal
+                return self._search_exact(query_embs, slots, k) if len(slots) else [[] for _ in query_embs]
+            # Packed little-endian bitmap: FAISS only visits slots whose bit is set
+            bitmap = np.packbits(mask, bitorder="little")
+            selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+
+        # Quantized / approximate index: oversample, then re-rank against the stored matrix
+        rescore = self.rescore and (self.kind != "flat" or self.precision != "float32")
+        fetch = min(k * RESCORE_OVERSAMPLE, self.ntotal) if rescore else k
+
+        search_params = self._search_params(fetch, params, selector)
+        if search_params is None:
+            scores, indices = self.index.search(query_embs, fetch)
+        else:
+            scores, indices = self.index.search(query_embs, fetch, params=search_params)
+        if self._overlay is not None and self._overlay.ntotal:
+            scores, indices = self._merge_overlay(query_embs, scores, indices, fetch, selector)
+
+        if rescore:
+            return [self._rescore(query_emb, row_indices, k) for query_emb, row_indices in zip(query_embs, indices)]
+        return [
+            [
+                (self.doc_ids[idx], float(score))
+                for idx, score in zip(row_indices, row_scores)
+                if 0 <= idx < len(self.doc_ids) and self.doc_ids[idx] is not None  # Safety check
+            ]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def _rescore(self, query_emb: np.ndarray, candidates: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """Re-rank FAISS candidates by inner product with their stored vectors"""
+        slots = np.array([idx for idx in candidates if 0 <= idx < len(self.doc_ids) and self.doc_ids[idx] is not None],
+                         dtype=np.int64)
+        if len(slots) == 0:
+            return []
+        scores = self._decode_rows(self._gather(slots)) @ query_emb
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(self.doc_ids[slots[i]], float(scores[i])) for i in order]
+
+    def search(self, query_emb: np.ndarray, top_k: int = 8, params: Optional[Dict] = None,
+               tag_filter: Optional[TagFilter] = None) -> List[Tuple[str, float]]:
+        """Search with a single normalized query vector, return (doc_id, score) pairs"""
+        return self.search_batch(query_emb.reshape(1, -1), top_k, params, tag_filter)[0]
+
+    def get_vectors(self, doc_ids: List[str]) -> np.ndarray:
+        """Gather stored embeddings for the given doc ids (one float32 row per id)"""
+        return self._decode_rows(self._gather([self.rows[doc_id] for doc_id in doc_ids]))
+
+    def recall_at_k(self, query_embs: np.ndarray, k: int = 10, params: Optional[Dict] = None) -> float:
+        """
+        Recall@k of the active index against exact (flat) search over the stored
+        matrix, for choosing the speed/recall tradeoff of a backend and its params.
+        """
+        query_embs = np.ascontiguousarray(query_embs, dtype=np.float32).reshape(-1, self.dimension)
+        slots = np.array(sorted(self.rows.values()), dtype=np.int64)
+        if len(slots) == 0 or len(query_embs) == 0:
+            return 1.0
+
+        k = min(k, len(slots))
+        exact_scores = query_embs @ self._decode_rows(self._gather(slots)).T
+        exact_top = np.argpartition(-exact_scores, k - 1, axis=1)[:, :k]
+        approx = self.search_batch(query_embs, k, params)
+
+        hits = 0
+        for row, results in zip(exact_top, approx):
+            expected = {self.doc_ids[slots[i]] for i in row}
+            hits += len(expected & {doc_id for doc_id, _ in results})
+        return hits / (k * len(query_embs))
+
+    def faiss_bytes(self) -> int:
+        """Serialized size of the FAISS structure (codes, graph / inverted lists, id map)"""
+        n = self.index.ntotal
+        inner = self.index
+        total = 0
+        if isinstance(inner, faiss.IndexIDMap2):
+            inner = faiss.downcast_index(inner.index)
+            total += 8 * n
+        if hasattr(inner, "hnsw"):
+            hnsw = inner.hnsw
+            total += 4 * hnsw.neighbors.size() + 4 * hnsw.levels.size() + 8 * hnsw.offsets.size()
+            total += faiss.downcast_index(inner.storage).sa_code_size() * n
+        elif isinstance(inner, faiss.IndexIVF):
+            total += (inner.code_size + 8) * n + 4 * inner.nlist * inner.d
+        else:
+            total += inner.sa_code_size() * n
+        if self._overlay is not None:
+            total += (4 * self.dimension + 8) * self._overlay.ntotal
+        return total
+
+    def memory_report(self) -> dict:
+        """Memory held by the FAISS codes and the stored matrix, extrapolated per million vectors"""
+        n = len(self.rows)
+        faiss_bytes = self.faiss_bytes()
+        matrix_bytes = self._matrix.nbytes + (self._tail.nbytes if self._tail is not None else 0)
+        per_vector = (faiss_bytes + self._matrix.itemsize * self.dimension * n) / n if n else 0.0
+        return {
+            "vectors": n,
+            "dimension": self.dimension,
+            "kind": self.kind,
+            "precision": self.precision,
+            "rescore": self.rescore,
+            "dead_ratio": round(self.dead_ratio, 3),  # tombstoned share of the FAISS index
+            "mapped": self._mapped,  # served from a shared snapshot mapping
+            "overlay_vectors": self._overlay.ntotal if self._overlay is not None else 0,
+            "faiss_mb": round(faiss_bytes / 2 ** 20, 2),
+            "embeddings_mb": round(matrix_bytes / 2 ** 20, 2),  # allocated capacity, incl. growth headroom
+            "bytes_per_vector": round(per_vector, 1),
+            "mb_per_million": round(per_vector * 1e6 / 2 ** 20, 1)
+        }
+
+    def save(self, path: str):
+        """Write the FAISS index, embedding matrix, slot mapping and tag bitmaps into directory `path`"""
+        index, dead, free = self.index, self._dead, self._free_slots
+        if self._overlay is not None and self._overlay.ntotal:
+            # Fold the overlay into a copy of the mapped structure; its tombstones become free slots
+            index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            ids = faiss.vector_to_array(self._overlay.id_map)
+            live = np.array([slot not in self._dead for slot in ids.tolist()], dtype=bool)
+            index.add_with_ids(self._overlay.index.reconstruct_n(0, len(ids))[live], ids[live])
+            dead = self._dead.difference(ids.tolist())
+            free = self._free_slots + sorted(self._dead.intersection(ids.tolist()))
+        faiss.write_index(index, os.path.join(path, "vectors.faiss"))
+        np.save(os.path.join(path, "embeddings.npy"), self.embeddings)
+        tag_names = sorted(self.tags.bitmaps)
+        tag_matrix = np.zeros((len(tag_names), len(self.doc_ids)), dtype=bool)
+        for row, tag in zip(tag_matrix, tag_names):
+            bitmap = self.tags.bitmaps[tag][:len(self.doc_ids)]
+            row[:len(bitmap)] = bitmap
+        np.save(os.path.join(path, "tags.npy"), tag_matrix)
+        with open(os.path.join(path, "slots.json"), "w") as f:
+            json.dump({
+                "backend": self.backend,
+                "kind": self.kind,
+                "precision": self.precision,
+                "int8_scale": self._int8_scale.tolist(),
+                "doc_ids": self.doc_ids,
+                "free_slots": free,
+                "dead_slots": sorted(dead),
+                "tags": tag_names
+            }, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorIndex":
+        """
+        Load an index written by `save`. With mmap=True the FAISS codes (flat codes,
+        HNSW storage, IVF lists) and the embedding matrix are mapped read-only, so
+        startup cost is bounded by disk reads, pages are only materialized when
+        touched, and processes mapping the same files share them through the page
+        cache. Upserts never write to the mappings: they go to the overlay.
+        """
+        with open(os.path.join(path, "slots.json")) as f:
+            slots = json.load(f)
+        # IO_FLAG_MMAP_IFC needs faiss >= 1.11; older builds read the codes into memory
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) if mmap else 0
+
+        self = cls.__new__(cls)
+        self.index = faiss.read_index(os.path.join(path, "vectors.faiss"), flags)
+        self._mapped = mmap
+        self._overlay = None
+        self.backend = slots["backend"]
+        self.precision = slots.get("precision", "float32")
+        self._int8_scale = np.array(slots.get("int8_scale", []), dtype=np.float32)
+        self.rescore = RESCORE_EXACT
+        self.kind = slots["kind"]
+        self.doc_ids = slots["doc_ids"]
+        self.rows = {doc_id: slot for slot, doc_id in enumerate(self.doc_ids) if doc_id is not None}
+        self._free_slots = slots["free_slots"]
+        self._dead = set(slots["dead_slots"])
+        self._dead_selector = None
+        self._matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r" if mmap else None)
+        self._tail = np.zeros((0, self._matrix.shape[1]), dtype=self._matrix.dtype) if mmap else None
+        self._map_positions()
+        self.tags = TagBitmaps()
+        tag_matrix = np.load(os.path.join(path, "tags.npy"))
+        self.tags.bitmaps = {tag: row.copy() for tag, row in zip(slots["tags"], tag_matrix)}
+        return self
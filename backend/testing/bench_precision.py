@@ -0,0 +1,56 @@
+"""bench_precision.py
+
+Memory per million vectors, query latency and recall@k for each vector storage
+precision (float32 / float16 / int8), with and without exact re-scoring.
+Recall is measured against exact float32 search. Uses synthetic clustered embeddings:
+
+    python -m backend.testing.bench_precision [n_vectors] [n_queries] [backend]
+"""
+
+import sys
+import time
+import numpy as np
+
+import backend.services.vector_index as vector_index
+from backend.services.vector_index import VectorIndex
+from backend.testing.bench_recall import synthetic_embeddings, DIM, K
+
+
+def exact_top_k(corpus, queries, k):
+    scores = queries @ corpus.T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def bench(backend, precision, rescore, doc_ids, corpus, queries, expected):
+    start = time.time()
+    index = VectorIndex(doc_ids, corpus.copy(), backend=backend, precision=precision, rescore=rescore)
+    build_ms = (time.time() - start) * 1000
+
+    start = time.time()
+    results = [index.search(q, K) for q in queries]
+    query_ms = (time.time() - start) * 1000 / len(queries)
+
+    hits = sum(len({f"d{i}" for i in row} & {doc_id for doc_id, _ in found}) for row, found in zip(expected, results))
+    recall = hits / (K * len(queries))
+    report = index.memory_report()
+    print(f"{backend:<9} {precision:<8} rescore={str(rescore):<5} build {build_ms:8.1f} ms   "
+          f"query {query_ms:7.3f} ms   recall@{K} {recall:.3f}   {report['mb_per_million']:8.1f} MB / 1M vectors")
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    backend = sys.argv[3] if len(sys.argv) > 3 else "flat"
+
+    vectors = synthetic_embeddings(n + n_queries)
+    corpus, queries = vectors[:n], vectors[n:]
+    doc_ids = [f"d{i}" for i in range(n)]
+    expected = exact_top_k(corpus, queries, K)
+
+    # Force the approximate backends regardless of the corpus-size threshold
+    vector_index.ANN_MIN_VECTORS = 0
+
+    print(f"Corpus: {n} x {DIM}, {n_queries} queries, backend {backend}\n")
+    for precision in vector_index.PRECISIONS:
+        for rescore in (False, True):
+            bench(backend, precision, rescore, doc_ids, corpus, queries, expected)
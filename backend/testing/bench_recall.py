@@ -0,0 +1,59 @@
+"""bench_recall.py
+
+Recall@k and query latency of each vector index backend against the exact flat index.
+Uses synthetic clustered embeddings so it runs without the sentence-transformer model:
+
+    python -m backend.testing.bench_recall [n_vectors] [n_queries]
+"""
+
+import sys
+import time
+import numpy as np
+
+import backend.services.vector_index as vector_index
+from backend.services.vector_index import VectorIndex
+
+DIM = 384
+K = 10
+
+
+def synthetic_embeddings(n, n_clusters=256, seed=1211):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, DIM)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench(backend, doc_ids, vectors, queries, param_grid=(None,)):
+    start = time.time()
+    index = VectorIndex(doc_ids, vectors.copy(), backend=backend)
+    build_ms = (time.time() - start) * 1000
+    print(f"{backend}: built in {build_ms:.1f} ms")
+
+    for params in param_grid:
+        start = time.time()
+        for q in queries:
+            index.search(q, K, params=params)
+        query_ms = (time.time() - start) * 1000 / len(queries)
+
+        recall = index.recall_at_k(queries, K, params=params)
+        print(f"  {str(params or 'default'):<24} query {query_ms:7.3f} ms   recall@{K} {recall:.3f}")
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    vectors = synthetic_embeddings(n + n_queries)
+    corpus, queries = vectors[:n], vectors[n:]
+    doc_ids = [f"d{i}" for i in range(n)]
+
+    # Force the approximate backends regardless of the corpus-size threshold
+    vector_index.ANN_MIN_VECTORS = 0
+
+    print(f"Corpus: {n} x {DIM}, {n_queries} queries\n")
+    bench("flat", doc_ids, corpus, queries)
+    bench("hnsw", doc_ids, corpus, queries, [{"ef_search": ef} for ef in (16, 64, 256)])
+    bench("ivf_flat", doc_ids, corpus, queries, [{"nprobe": p} for p in (4, 16, 64)])
+    bench("ivf_pq", doc_ids, corpus, queries, [{"nprobe": p} for p in (4, 16, 64)])
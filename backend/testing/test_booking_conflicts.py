@@ -0,0 +1,69 @@
+import asyncio
+import os
+import tempfile
+from fastapi import HTTPException
+from backend.services import appointments
+from backend.services.database import DatabaseService
+from backend.routes.appointment_tools import schedule_endpoint, schedule_batch_endpoint
+from backend.models.schedule_input import ScheduleInput, ScheduleBatchInput
+
+# Both booking endpoints must agree: same booking -> already_booked,
+# same patient and slot at another location -> conflict
+
+
+async def single(patient, slot, location):
+    try:
+        return await schedule_endpoint(ScheduleInput(patient=patient, preferred_slot_iso=slot, location=location))
+    except HTTPException as e:
+        return {"ok": False, "status": "conflict", "http_status": e.status_code, "detail": e.detail}
+
+
+async def batch(*items):
+    payload = ScheduleBatchInput(appointments=[
+        ScheduleInput(patient=patient, preferred_slot_iso=slot, location=location) for patient, slot, location in items
+    ])
+    return (await schedule_batch_endpoint(payload))["results"]
+
+
+async def main():
+    # Throwaway database so the test never touches backend/appointments.db
+    db = DatabaseService(os.path.join(tempfile.mkdtemp(), "appointments.db"))
+    await db.init_db()
+    appointments.db_service = appointments.appt_ids.db = db
+
+    print("=== Test 1: single booking, then the batch endpoint ===")
+    first = await single("Chen", "2025-10-21T10:30", "Midtown")
+    print(f"Single: {first}")
+    assert first["status"] == "created"
+    results = await batch(("chen", "2025-10-21T10:30", "midtown"), ("Chen", "2025-10-21T10:30", "Uptown"))
+    print(f"Batch: {results}")
+    assert results[0]["status"] == "already_booked" and results[0]["appt_id"] == first["appt_id"]
+    assert results[1]["status"] == "conflict" and results[1]["conflicting_appt_id"] == first["appt_id"]
+
+    print("\n=== Test 2: batch booking, then the single endpoint ===")
+    results = await batch(("Rivera", "2025-10-22T09:00", "Downtown"))
+    print(f"Batch: {results}")
+    assert results[0]["status"] == "created"
+    again = await single("RIVERA", "2025-10-22T09:00", "downtown")
+    print(f"Single (same booking): {again}")
+    assert again["status"] == "already_booked" and again["appt_id"] == results[0]["appt_id"]
+    conflict = await single("Rivera", "2025-10-22T09:00", "Midtown")
+    print(f"Single (other location): {conflict}")
+    assert conflict["status"] == "conflict" and conflict["http_status"] == 409
+    assert results[0]["appt_id"] in conflict["detail"]
+
+    print("\n=== Test 3: conflicts within one batch ===")
+    results = await batch(("Diaz", "2025-10-23T08:00", "Midtown"), ("Diaz", "2025-10-23T08:00", "Uptown"))
+    print(f"Batch: {results}")
+    assert [r["status"] for r in results] == ["created", "conflict"]
+    conflict = await single("Diaz", "2025-10-23T08:00", "Downtown")
+    assert conflict["status"] == "conflict"
+
+    counts = await db.get_appointment_counts()
+    print(f"\nCounts: {counts}")
+    assert counts == {"scheduled": 3}
+    await db.close()
+    print("\n✅ All booking conflict tests passed!")
+
+
+asyncio.run(main())
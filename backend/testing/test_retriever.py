@@ -1,8 +1,8 @@
 from sentence_transformers import SentenceTransformer  # Only for embeddings, not LLM
-import faiss
 import json
 
 from backend.services.knowledgeRetriever import HybridRetriever
+from backend.services.vector_index import VectorIndex
 
 ## Load model
 model = SentenceTransformer('all-MiniLM-L6-v2')  # Only for embeddings, not LLM
@@ -17,14 +17,10 @@ documents = {d["id"]: d for d in docs}
 texts = [d["text"] for d in docs]
 doc_ids = [d["id"] for d in docs]
 embeddings = model.encode(texts)
-
-dimension = embeddings.shape[1]
-index = faiss.IndexFlatIP(dimension)
-faiss.normalize_L2(embeddings)
-index.add(embeddings)
+index = VectorIndex(doc_ids, embeddings)
 
 # Create retriever
-retriever = HybridRetriever(model, index, documents, doc_ids)
+retriever = HybridRetriever(model, index, documents)
 
 # Test queries
 test_queries = [
@@ -1,9 +1,32 @@
+import threading
 from backend.services.lru_cache import LRUCache
+from backend.services.concurrency import ReadWriteLock
+from backend.services.semantic_cache import SemanticCache
+from backend.variables.settings import (
+    QUERY_CACHE_CAPACITY, QUERY_CACHE_TTL_S, QUERY_CACHE_MAX_BYTES, EMBEDDING_CACHE_CAPACITY,
+    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_CAPACITY
+)
 
 documents = {}
+chunks = {}  # chunk_id -> {id, doc_id, text, tags}
+doc_chunks = {}  # doc_id -> [chunk_id]
 index = None
-doc_ids = []
+lexical_index = None
+index_lock = ReadWriteLock()  # many concurrent searches, exclusive in-place index mutation
+writer_lock = threading.RLock()  # one index writer at a time (upserts, rebuilds); searches never take it
+rebuild_thread = None  # background full rebuild in progress, if any
+vector_rebuild_thread = None  # background FAISS rebuild (ANN switch / compaction) in progress, if any
+generation = 0  # corpus generation, bumped on every index mutation
+snapshot_generation = 0  # generation of the on-disk snapshot our indexes match (shared-index mode)
+delta_offset = 0  # bytes of that snapshot's delta log already applied (shared-index mode)
+content_hash = None  # knowledge base the snapshot lineage was built from
 model = None
+embedder = None  # EmbeddingBatcher in front of model for query encodes
 retriever = None
 session_context = {}
-query_cache = LRUCache(capacity=30)
\ No newline at end of file
+# (normalized query, top_k, generation) -> results
+query_cache = LRUCache(capacity=QUERY_CACHE_CAPACITY, ttl=QUERY_CACHE_TTL_S, max_bytes=QUERY_CACHE_MAX_BYTES)
+embedding_cache = LRUCache(capacity=EMBEDDING_CACHE_CAPACITY)  # normalized query -> query embedding
+semantic_cache = SemanticCache(
+    capacity=SEMANTIC_CACHE_CAPACITY, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=QUERY_CACHE_TTL_S
+) if SEMANTIC_CACHE_ENABLED else None
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+
+# Chunking (applied to every document at ingest)
+CHUNK_MODE = os.getenv("CHUNK_MODE", "sentence")  # "sentence" | "token"
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "120"))  # whitespace tokens; MiniLM truncates ~256 wordpieces
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "20"))
+
+# Caches
+QUERY_CACHE_CAPACITY = int(os.getenv("QUERY_CACHE_CAPACITY", "20000"))  # keyed by (query, top_k, corpus generation)
+QUERY_CACHE_TTL_S = float(os.getenv("QUERY_CACHE_TTL_S", "30"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_CAPACITY = int(os.getenv("EMBEDDING_CACHE_CAPACITY", "4096"))
+# Semantic cache: paraphrased queries whose embeddings reach the cosine threshold share results
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "4096"))
+
+# Appointment database (SQLite in WAL mode): one long-lived writer connection plus DB_READERS
+# reader connections, opened at startup. Each connection keeps DB_STATEMENT_CACHE prepared statements.
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # NORMAL: fsync at checkpoints; safe against app crashes in WAL
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))  # page cache per connection
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))  # wait on other processes' write locks
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+# Largest POST /tools/schedule_appointments batch (one write transaction holds the database)
+SCHEDULE_BATCH_MAX = int(os.getenv("SCHEDULE_BATCH_MAX", "10000"))
+# Appointment ids come from a sequence table; each worker leases this many at a time
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "100"))
+
+# Embedding model
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# On-disk index snapshot used for warm starts
+INDEX_SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "backend/variables/index_snapshot")
+# Shared index across uvicorn workers: workers map the same snapshot (one copy in the page cache),
+# upserts are appended to the snapshot's delta log under a file lock and other workers replay them
+# within SHARED_INDEX_POLL_S; once the log reaches SHARED_INDEX_CHECKPOINT_MB it is folded into a new snapshot
+SHARED_INDEX = os.getenv("SHARED_INDEX", "0") == "1"
+SHARED_INDEX_POLL_S = float(os.getenv("SHARED_INDEX_POLL_S", "1.0"))
+SHARED_INDEX_CHECKPOINT_MB = float(os.getenv("SHARED_INDEX_CHECKPOINT_MB", "32"))
+
+# Vector index backend: "flat" (exact), "hnsw", "ivf_flat" or "ivf_pq".
+# Approximate backends are only used once the corpus reaches ANN_MIN_VECTORS
+# (IVF/PQ need enough vectors to train); smaller corpora stay exact. Crossing it
+# trains the backend on a background thread while the exact index keeps serving.
+INDEX_BACKEND = os.getenv("INDEX_BACKEND", "flat")
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "10000"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = auto (4 * sqrt(n))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+IVF_TRAIN_SAMPLE = int(os.getenv("IVF_TRAIN_SAMPLE", "100000"))
+PQ_M = int(os.getenv("PQ_M", "48"))  # sub-quantizers; must divide the embedding dimension
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+# Tombstoned (replaced / removed) vectors are compacted away in the background once they make up
+# this fraction of the FAISS index; until then searches skip them with an ID selector
+TOMBSTONE_COMPACT_RATIO = float(os.getenv("TOMBSTONE_COMPACT_RATIO", "0.2"))
+# A memory-mapped snapshot index takes upserts into an in-memory exact overlay that searches merge
+# with the shared mapping; past this many vectors the overlay is folded in by a background rebuild
+INDEX_OVERLAY_MAX = int(os.getenv("INDEX_OVERLAY_MAX", "20000"))
+
+# Vector storage precision for FAISS codes and the stored matrix: "float32", "float16" or "int8"
+# (scalar quantization: 2x / 4x less memory). RESCORE_EXACT re-ranks RESCORE_OVERSAMPLE * k
+# FAISS candidates against the stored vectors, recovering quantization / PQ ranking error.
+VECTOR_PRECISION = os.getenv("VECTOR_PRECISION", "float32")
+RESCORE_EXACT = os.getenv("RESCORE_EXACT", "0") == "1"
+RESCORE_OVERSAMPLE = int(os.getenv("RESCORE_OVERSAMPLE", "4"))
+
+# MMR re-ranks the first MMR_CANDIDATE_POOL fused chunks (50-200 trades latency for diversity);
+# lexical and semantic search each retrieve at least that many
+MMR_CANDIDATE_POOL = int(os.getenv("MMR_CANDIDATE_POOL", "8"))
+
+# Retrieval runs on a bounded thread pool off the event loop (FAISS/torch release the GIL).
+# Pool threads spend most of a query waiting on the micro-batched query encode, so the pool is
+# sized for concurrency rather than cores: one thread per core would starve the encode batcher
+RETRIEVAL_MAX_CONCURRENCY = int(os.getenv("RETRIEVAL_MAX_CONCURRENCY", "64"))  # in-flight retrievals before callers queue
+RETRIEVAL_WORKERS = int(os.getenv(
+    "RETRIEVAL_WORKERS", str(min(RETRIEVAL_MAX_CONCURRENCY, max(16, 2 * (os.cpu_count() or 4))))
+))
+
+# Batch retrieval (/retrieve/batch) takes the index read lock once per slice of this many queries
+RETRIEVE_BATCH_CHUNK = int(os.getenv("RETRIEVE_BATCH_CHUNK", "256"))
+
+# Query-embedding micro-batching: concurrent encodes arriving within the window share one model call
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))